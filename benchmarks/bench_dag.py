@@ -0,0 +1,73 @@
+"""Submit and complete a large queue of jobs with the scheduler DAG, compared to the previous
+implementation, which scanned all nodes and edges for every leaf query and removal.
+
+    python benchmarks/bench_dag.py
+"""
+
+import threading
+import time
+import typing
+
+from cvde.scheduler import DAG
+
+T = typing.TypeVar("T")
+
+
+class ListDAG(typing.Generic[T]):
+    """DAG of the scheduler before ready nodes were tracked"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._edges: dict[T, list[T]] = {}
+        self._nodes: list[T] = []
+
+    def add_node(self, node: T, to_nodes: list[T] | None = None) -> None:
+        with self._lock:
+            self._nodes.append(node)
+            self._edges[node] = list(to_nodes or [])
+
+    def pop(self, node: T) -> None:
+        with self._lock:
+            self._nodes.remove(node)
+            self._edges.pop(node)
+            for edges in self._edges.values():
+                if node in edges:
+                    edges.remove(node)
+
+    def get_leaves(self) -> list[T]:
+        with self._lock:
+            return [node for node, edges in self._edges.items() if len(edges) == 0]
+
+
+def benchmark(dag_type: type, n_nodes: int, n_parallel: int = 8) -> float:
+    """seconds to submit n_nodes jobs and run them to completion, with n_parallel running
+    jobs. Every 10th job waits for the previous one, like chained sweeps."""
+    dag = dag_type()
+    start = time.perf_counter()
+    for i in range(n_nodes):
+        dag.add_node(i, [i - 1] if i % 10 == 0 and i > 0 else [])
+        # the scheduler queries the ready jobs after every submission
+        dag.get_leaves()
+
+    running: list[int] = []
+    launched: set[int] = set()
+    n_done = 0
+    while n_done < n_nodes:
+        for node in dag.get_leaves():
+            if len(running) >= n_parallel:
+                break
+            if node not in launched:
+                launched.add(node)
+                running.append(node)
+        dag.pop(running.pop(0))
+        n_done += 1
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    for n_nodes in [1_000, 10_000]:
+        before = benchmark(ListDAG, n_nodes)
+        after = benchmark(DAG, n_nodes)
+        print(f"{n_nodes} nodes")
+        print(f"  before: {before:8.3f} s")
+        print(f"  after:  {after:8.3f} s ({before / after:.0f}x)")
@@ -0,0 +1,60 @@
+"""Write throughput of ThreadPrinter with a registered output file, compared to the previous
+implementation, which opened the output file for every write.
+
+    python benchmarks/bench_thread_printer.py
+"""
+
+import multiprocessing as mp
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import colorama
+
+from cvde.threaded_printer import ThreadPrinter
+
+
+class UnbufferedThreadPrinter(ThreadPrinter):
+    """write path of ThreadPrinter before output files were kept open"""
+
+    def register_new_out(self, file_path: Path) -> None:
+        self.file_paths = {mp.current_process().name: file_path}
+
+    def write(self, value: str) -> int:
+        result = re.search("[0-9]+", mp.current_process().name)
+        chosen_index = 0 if result is None else int(result.group())
+        chosen_color = self.COLORS[chosen_index % len(self.COLORS)]
+        is_main = mp.parent_process() is None
+        color = colorama.Fore.WHITE if is_main else chosen_color
+
+        self.stream.write(color + value + self.reset_color)
+        self.stream.flush()
+
+        if mp.current_process().name in self.file_paths:
+            file_path = self.file_paths[mp.current_process().name]
+            with file_path.open("a") as F:
+                F.write(value)
+        return 1
+
+
+def benchmark(printer_type: type[ThreadPrinter], n_writes: int) -> float:
+    """returns writes per second"""
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as terminal:
+        printer = printer_type(terminal)
+        printer.register_new_out(Path(tmp) / "stdout.txt")
+        # progress bar like output: carriage returns without newlines
+        start = time.perf_counter()
+        for i in range(n_writes):
+            printer.write(f"\r{i}/{n_writes} [=====>    ] loss: 0.1234")
+        printer.flush()
+        return n_writes / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n_writes = 100_000
+    before = benchmark(UnbufferedThreadPrinter, n_writes)
+    after = benchmark(ThreadPrinter, n_writes)
+    print(f"before: {before:12.0f} writes/s")
+    print(f"after:  {after:12.0f} writes/s ({after / before:.1f}x)")
@@ -2,9 +2,13 @@ import logging
 import os
 import pathlib
 import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import click
+import yaml
 from pathlib import Path
 import cvde
+from cvde.scheduler_server import SchedulerClient, SchedulerServer, SOCKET_PATH
 
 
 @click.group()
@@ -20,6 +24,172 @@ def init(name: str) -> None:
     cvde.Workspace.init_workspace(name)
 
 
+@run.command()
+def rebuild_catalog() -> None:
+    "Rebuild the index of runs by rescanning all folders in log/"
+    n_runs = cvde.job.RunCatalog().rebuild()
+    print(f"Indexed {n_runs} runs.")
+
+
+@run.command()
+@click.option("-j", "--jobs", default=os.cpu_count(), help="Number of parallel workers")
+def compact(jobs: int) -> None:
+    "Convert finished runs from one file per logged step to packed files per variable"
+    from cvde.job.compact import compact_run, is_running, CompactResult
+
+    results: list[CompactResult] = []
+    to_compact: list[str] = []
+    for log in cvde.job.RunLogger.list_runs():
+        if is_running(log):
+            results.append(CompactResult(log.folder_name, skipped=True))
+        else:
+            to_compact.append(log.folder_name)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result in pool.map(compact_run, to_compact):
+            results.append(result)
+            for error in result.errors:
+                print(f"{result.folder_name}: failed to compact {error}")
+
+    skipped = [r.folder_name for r in results if r.skipped]
+    if len(skipped) > 0:
+        print(f"Skipped {len(skipped)} runs in progress: {', '.join(skipped)}")
+
+    compacted = [r for r in results if len(r.converted_vars) > 0]
+    files_before = sum(r.files_before for r in compacted)
+    files_after = sum(r.files_after for r in compacted)
+    bytes_before = sum(r.bytes_before for r in compacted)
+    bytes_after = sum(r.bytes_after for r in compacted)
+    print(
+        f"Compacted {sum(len(r.converted_vars) for r in compacted)} variables "
+        f"in {len(compacted)} runs: "
+        f"{files_before} -> {files_after} files, "
+        f"{bytes_before / 1e6:.1f} MB -> {bytes_after / 1e6:.1f} MB"
+    )
+
+
+@run.command()
+@click.option(
+    "--min-unused-hours",
+    default=1.0,
+    help="Keep snapshots that were used more recently",
+    show_default=True,
+)
+def clean_snapshots(min_unused_hours: float) -> None:
+    "Delete snapshots of the code in log/.snapshots, that no run links to anymore"
+    from cvde.job.snapshot import remove_unused_snapshots
+
+    removed = remove_unused_snapshots(min_unused_seconds=min_unused_hours * 3600)
+    print(f"Deleted {len(removed)} unused snapshots.")
+
+
+@run.command()
+@click.option(
+    "-w",
+    "--warm-workers",
+    default=0,
+    help="Number of pre-started worker processes, to launch jobs without import time",
+)
+def scheduler(warm_workers: int) -> None:
+    "Run the job scheduler, to submit jobs without the GUI"
+    sys.path.append(os.getcwd())
+    server = SchedulerServer(cvde.Scheduler(warm_workers=warm_workers))
+    print(f"Scheduler listening on {SOCKET_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.warning("User interrupted.")
+
+
+def get_client() -> SchedulerClient:
+    client = SchedulerClient.connect()
+    if client is None:
+        raise click.ClickException("Scheduler is not running, start it with `cvde scheduler`.")
+    return client
+
+
+@run.command()
+@click.argument("JOB")
+@click.argument("CONFIG")
+@click.option("-n", "--name", help="Run name, defaults to the config name")
+@click.option("-t", "--tag", "tags", multiple=True, help="Tag of the run, can be repeated")
+@click.option("-e", "--env", default="", help="Environment variables, e.g. 'A=1;B=2'")
+@click.option("-a", "--after", multiple=True, help="Wait for this submission (run name or id)")
+@click.option("--gpus", default=0, help="Number of GPUs")
+@click.option("--cpus", default=0, help="Number of CPU cores")
+@click.option("--memory-gb", default=0.0, help="RAM in GB")
+@click.option("--capture-fds", is_flag=True, help="Also capture output of C/C++ extensions")
+def submit(
+    job: str,
+    config: str,
+    name: str | None,
+    tags: tuple[str, ...],
+    env: str,
+    after: tuple[str, ...],
+    gpus: int,
+    cpus: int,
+    memory_gb: float,
+    capture_fds: bool,
+) -> None:
+    "Submit JOB with configs/CONFIG.yml to the scheduler"
+    from cvde.resources import ResourceRequest
+    from cvde.sweep import make_submissions
+
+    config_path = Path("configs") / f"{config}.yml"
+    if not config_path.exists():
+        raise click.ClickException(f"{config_path} does not exist.")
+    with config_path.open() as F:
+        config_dict = yaml.load(F, Loader=yaml.Loader)
+
+    env_dict = {
+        key.strip(): value.strip()
+        for key, value in [word.split("=") for word in env.split(";") if "=" in word]
+    }
+    client = get_client()
+    try:
+        # several submissions, if the config defines a sweep
+        submissions = make_submissions(
+            config=config_dict,
+            job_name=job,
+            run_name=name or config,
+            tags=list(tags),
+            env=env_dict,
+            resources=ResourceRequest(gpus, cpus, memory_gb),
+            capture_fds=capture_fds,
+        )
+    except (ValueError, TypeError) as e:
+        raise click.ClickException(f"Invalid sweep: {e}")
+    try:
+        client.submit_many(submissions, list(after))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for submission in submissions:
+        print(f"Submitted {submission.run_name} ({submission.id})")
+
+
+@run.command()
+def queue() -> None:
+    "List the submissions of the scheduler"
+    for entry in get_client().get_queue():
+        wait_for = f" after {', '.join(entry['wait_for'])}" if len(entry["wait_for"]) > 0 else ""
+        print(
+            f"{entry['id']}  {entry['state']:8}  {entry['run_name']} ({entry['job_name']}){wait_for}"
+        )
+
+
+@run.command()
+@click.argument("SUBMISSIONS", nargs=-1, required=True)
+def cancel(submissions: tuple[str, ...]) -> None:
+    "Cancel pending SUBMISSIONS, given by run name or id"
+    client = get_client()
+    for submission in submissions:
+        try:
+            client.cancel(submission)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        print(f"Cancelled {submission}")
+
+
 @run.command()
 @click.option("-p", "--port", default="8501", help="Port to access the GUI", show_default=True)
 @click.argument("ROOT", type=click.Path(exists=True, path_type=pathlib.Path), default=os.getcwd())
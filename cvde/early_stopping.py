@@ -0,0 +1,125 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class EarlyStopping:
+    """Early stopping of the runs of a sweep by asynchronous successive halving (ASHA),
+    given by the key `early_stopping` of a sweep:
+
+        early_stopping:
+          metric: val_loss  # logged scalar variable
+          mode: min  # or max
+          reduction_factor: 3  # about 1/3 of the runs continue at each milestone
+          milestones: [1, 3, 9]  # indices of the metric, or min_step and max_step:
+          min_step: 1  # milestones min_step * reduction_factor**k, below max_step
+          max_step: 27
+
+    When a run logs the metric at a milestone, it is stopped if its value is not in the
+    best 1/reduction_factor of the values the other runs of the sweep had there.
+    """
+
+    metric: str
+    mode: str = "min"
+    reduction_factor: int = 3
+    milestones: list[int] | None = None
+    min_step: int | None = None
+    max_step: int | None = None
+
+    def __post_init__(self) -> None:
+        # values of YAML configs, e.g. reduction_factor: 2.5 would give fractional milestones
+        if self.milestones is not None and not isinstance(self.milestones, list):
+            raise ValueError("The milestones of early stopping must be a list.")
+        steps = [self.reduction_factor, self.min_step, self.max_step, *(self.milestones or [])]
+        if not all(is_int(step) for step in steps if step is not None):
+            raise ValueError("The reduction factor and steps of early stopping must be integers.")
+        if self.mode not in ["min", "max"]:
+            raise ValueError(f"Unknown mode {self.mode} of early stopping, use min or max.")
+        if self.reduction_factor < 2:
+            raise ValueError("The reduction factor of early stopping must be at least 2.")
+        if self.milestones is None and (self.min_step is None or self.max_step is None):
+            raise ValueError("Early stopping needs milestones, or min_step and max_step.")
+        if self.milestones is not None:
+            if len(self.milestones) == 0 or any(m < 1 for m in self.milestones):
+                raise ValueError(
+                    "The milestones of early stopping must be a non-empty list of positive steps."
+                )
+        else:
+            assert self.min_step is not None and self.max_step is not None
+            if self.min_step < 1:
+                raise ValueError("The min_step of early stopping must be at least 1.")
+            if self.max_step <= self.min_step:
+                raise ValueError("The max_step of early stopping must be larger than min_step.")
+
+    def get_milestones(self) -> list[int]:
+        if self.milestones is not None:
+            return sorted(self.milestones)
+        assert self.min_step is not None and self.max_step is not None
+        milestones = []
+        step = self.min_step
+        while step < self.max_step:
+            milestones.append(step)
+            step *= self.reduction_factor
+        return milestones
+
+
+def is_int(value: object) -> bool:
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+class SuccessiveHalving:
+    """State of the early stopping of one sweep: the values of its runs at each milestone.
+    Runs are decided on as soon as they reach a milestone, without waiting for the other
+    runs, so that slots of stopped runs go to pending runs right away."""
+
+    def __init__(self, spec: EarlyStopping) -> None:
+        self.spec = spec
+        self.milestones = spec.get_milestones()
+        self.rungs: dict[int, list[float]] = {milestone: [] for milestone in self.milestones}
+        # per run: number of logged entries of the metric read so far, see n_read
+        self._n_read: dict[str, int] = {}
+        self._next_rung: dict[str, int] = {}
+        self._stopped: set[str] = set()
+
+    def n_read(self, run: str) -> int:
+        """cursor for RunLogger.read_var, to only pass newly logged entries to update"""
+        return self._n_read.get(run, 0)
+
+    def update(self, run: str, entries: list[tuple[int, float]]) -> tuple[int, float] | None:
+        """Pass the (index, value) entries of the metric logged by run since the last
+        update. Returns the milestone and value, if run should be stopped there."""
+        self._n_read[run] = self.n_read(run) + len(entries)
+        if run in self._stopped:
+            return None
+
+        for index, value in entries:
+            rung = self._next_rung.get(run, 0)
+            if rung == len(self.milestones) or index < self.milestones[rung]:
+                continue
+            # a run might skip milestones, e.g. when it logs the metric every few steps
+            while rung < len(self.milestones) and index >= self.milestones[rung]:
+                rung += 1
+            self._next_rung[run] = rung
+            milestone = self.milestones[rung - 1]
+
+            # the larger, the better
+            score = value if self.spec.mode == "max" else -value
+            if math.isnan(score):
+                score = -math.inf
+            recorded = self.rungs[milestone]
+            keep = len(recorded) == 0 or score >= np.quantile(
+                recorded, 1 - 1 / self.spec.reduction_factor
+            )
+            recorded.append(score)
+            if not keep:
+                self._stopped.add(run)
+                return milestone, value
+        return None
+
+    def forget(self, run: str) -> None:
+        """drop the cursor of a run that ended, its values at the milestones are kept"""
+        self._n_read.pop(run, None)
+        self._next_rung.pop(run, None)
+        self._stopped.discard(run)
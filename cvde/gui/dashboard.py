@@ -1,11 +1,10 @@
 import time
 import os
 import itertools as it
-from pathlib import Path
 import streamlit as st
 import cvde
 from .page import Page
-import multiprocessing as mp
+import signal
 
 
 class Dashboard(Page):
@@ -13,12 +12,10 @@ class Dashboard(Page):
         pass
 
     def run(self) -> None:
-        log_dir = Path("log")
-        if not log_dir.exists():
-            log_dir.mkdir()            
-        log_folders = os.listdir("log")
-        all_logs = [cvde.job.RunLogger.from_log(folder) for folder in log_folders]
-        running_logs = [l for l in all_logs if l.is_in_progress()]
+        all_logs = cvde.job.RunLogger.list_runs()
+        # runs indexed by a rescan have an unknown status
+        candidates = [l for l in all_logs if l.status in ["running", "unknown"]]
+        running_logs = [l for l in candidates if l.is_in_progress()]
 
         with st.expander("Runs", expanded=True):
             cols = it.cycle(st.columns(2))
@@ -35,21 +32,24 @@ class Dashboard(Page):
 
                     if st.session_state.get("confirm_kill_job_" + log.name, False):
                         cvde.gui.warn(f"Stopping {log.display_name}...")
-                        process = log.get_mp_process()
-                        process.terminate()
+                        # the run might have been started by another GUI or scheduler
+                        try:
+                            os.kill(log.pid, signal.SIGTERM)
+                        except ProcessLookupError:
+                            pass
 
                         time.sleep(1.0)
                         st.rerun()
 
                     try:
-                        stdout = "\n".join(log.get_stdout().strip().split("\n")[-1:])
+                        stdout = log.tail_stdout(n_lines=1)
                         st.text("stdout")
                         st.code(stdout, language="html")
                     except Exception:
                         pass
 
                     try:
-                        stderr = "\n".join(log.get_stderr().strip().split("\n")[-1:])
+                        stderr = log.tail_stderr(n_lines=1)
                         st.text("stderr")
                         st.code(stderr, language="html")
                     except Exception:
@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def downsample_minmax(x: np.ndarray, y: np.ndarray, n_points: int) -> tuple[np.ndarray, np.ndarray]:
+    """Reduce a curve to at most about n_points points. The curve is split into buckets
+    of equal length and the minimum and maximum of every bucket is kept, so that spikes
+    (e.g. diverging losses) stay visible, unlike with strided subsampling."""
+    n = len(y)
+    if n <= n_points or n_points < 4:
+        return x, y
+
+    n_buckets = n_points // 2
+    bucket_size = int(np.ceil(n / n_buckets))
+    n_buckets = int(np.ceil(n / bucket_size))
+
+    # pad the last bucket, so that all buckets can be reduced at once
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+
+    # logged values are free of nans, so only padding is ignored
+    argmin = np.nanargmin(buckets, axis=1) + offsets
+    argmax = np.nanargmax(buckets, axis=1) + offsets
+
+    # always keep the end points, unique also sorts the indices by position
+    keep = np.unique(np.concatenate([[0, n - 1], argmin, argmax]))
+    return x[keep], y[keep]
@@ -2,31 +2,72 @@ import streamlit as st
 from streamlit.delta_generator import DeltaGenerator
 import streamlit_scrollable_textbox as stx  # type: ignore
 import itertools as it
-import os
 import yaml
 import numpy as np
 import plotly.graph_objects as go  # type: ignore
 import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+from PIL import Image
 
-from cvde.job.run_logger import RunLogger
+from cvde.job.run_logger import LogEntry, RunLogger, to_datetime64
+from cvde.job import output_file
 from .page import Page
+from .downsample import downsample_minmax
+
+
+@functools.lru_cache(maxsize=256)
+def load_image(path: str) -> Image.Image:
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+_prefetch_pool = ThreadPoolExecutor(2, "image_prefetch")
+
+
+def entry_paths(entry: LogEntry) -> tuple[Path, Path | None]:
+    """image file and thumbnail of an image entry"""
+    thumbnail = entry.thumbnail
+    return Path(entry.data), None if thumbnail is None else Path(thumbnail)
 
 
 class JobInspector(Page):
+    # curves with more points are drawn with WebGL
+    WEBGL_THRESHOLD = 5000
+    # number of images before and after the selected one, which are decoded in advance
+    PREFETCH = 2
+    # max. number of logged vectors in a ridgeline plot
+    MAX_RIDGES = 20
+    # bytes of stdout/stderr shown at once
+    OUTPUT_PAGE_SIZE = 1 << 16
+
     def __init__(self) -> None:
         pass
 
     def run(self) -> None:
         self.expanders: dict[str, DeltaGenerator] = {}
         self.expand_all = False
-        runs = os.listdir("log")
-        all_logs = [RunLogger.from_log(run) for run in runs]
+        all_logs = RunLogger.list_runs()
         all_logs.sort(key=lambda t: t.started, reverse=True)
 
         with st.sidebar:
             st.subheader("Settings")
             self.use_time = st.checkbox("Use actual time")
             self.log_axes = st.checkbox("Logarithmic", value=True)
+            self.n_points = st.number_input(
+                "Points per curve",
+                min_value=100,
+                value=2000,
+                step=500,
+                help="Long curves are downsampled to this many points, keeping minima and maxima.",
+            )
+            self.vector_style = st.radio(
+                "Show vectors as", ["Heatmap", "Ridgeline"], horizontal=True
+            )
             self.expand_all = st.checkbox("Expand all")
             selected_tags = st.multiselect("Filter by tags", options=st.session_state.tags)
             cols = st.columns(2)
@@ -55,6 +96,7 @@ class JobInspector(Page):
                         st.error(f"Can't delete running job {log.name}")
                     else:
                         log.delete_log()
+                        self.drop_cached(log)
                 time.sleep(0.5)
                 st.rerun()
 
@@ -83,15 +125,60 @@ class JobInspector(Page):
         # display data
         # for each variable name, assemble plot of data
         for var_name in var_names:
-            fig = None
+            traces: list[tuple[RunLogger, np.ndarray, np.ndarray]] = []
             for log in selected_logs:
                 try:
-                    run_data = log.read_var(var_name)
+                    # packed scalars are loaded in one vectorized read
+                    records = self.load_records(log, var_name, log.read_scalars)
+                except FileNotFoundError:
+                    records = None
+
+                if records is not None:
+                    if len(records) == 0:
+                        continue
+                    x = to_datetime64(records["t"]) if self.use_time else records["index"]
+                    traces.append((log, x, records["value"]))
+                    continue
+
+                try:
+                    # only the index of images is loaded, images are loaded on demand
+                    image_records = self.load_records(log, var_name, log.read_images)
                 except FileNotFoundError:
+                    image_records = None
+
+                if image_records is not None:
+                    if len(image_records) > 0:
+                        self.show_image(
+                            var_name,
+                            log,
+                            len(image_records),
+                            lambda i: (
+                                log.image_path(var_name, image_records[i]),
+                                log.thumbnail_path(var_name, image_records[i]),
+                            ),
+                        )
                     continue
 
-                key = "t" if self.use_time else "index"
-                x = np.array([getattr(i, key) for i in run_data])
+                try:
+                    # vectors are memory-mapped, only displayed rows are read
+                    vector_records = self.load_records(log, var_name, log.read_vectors)
+                except FileNotFoundError:
+                    vector_records = None
+
+                if vector_records is not None:
+                    if len(vector_records) > 0:
+                        self.show_vectors(var_name, log, vector_records)
+                    continue
+
+                try:
+                    run_data = self.load_entries(log, var_name)
+                except FileNotFoundError:
+                    continue
+
+                if self.use_time:
+                    x = np.array([i.t for i in run_data], dtype="datetime64[us]")
+                else:
+                    x = np.array([i.index for i in run_data])
                 y = [i.data for i in run_data]
 
                 if len(y) == 0:
@@ -106,35 +193,18 @@ class JobInspector(Page):
                     y = [i.numpy() for i in y]
 
                 if run_data[0].is_image:
-                    exp = self.get_expander(var_name)
-                    # select index
-                    if len(y) > 1:
-                        epoch = exp.slider(
-                            "Select",
-                            min_value=0,
-                            label_visibility="hidden",
-                            max_value=len(y) - 1,
-                            value=len(y) - 1,
-                            key="num_epoch_" + var_name + log.folder_name,
-                        )
-                    else:
-                        epoch = 0
-                    img_path = y[epoch]
-                    # read img
-                    # img = Image.open(img_path)
-
-                    exp.image(img_path, caption=f"{log.display_name}")
+                    self.show_image(
+                        var_name,
+                        log,
+                        len(run_data),
+                        lambda i: entry_paths(run_data[i]),
+                    )
 
                 else:
-                    if fig is None:
-                        fig = go.Figure()
+                    traces.append((log, x, np.asarray(y)))
 
-                    fig.add_scatter(x=x, y=y, name=log.display_name, showlegend=True)
-                    exp = self.get_expander(var_name, create_empty=True)
-                    if self.log_axes:
-                        fig.update_yaxes(type="log")
-                    fig.update_layout(legend=dict(orientation="h"))
-                    exp.plotly_chart(fig, key=log.display_name + var_name)  # unique key
+            if len(traces) > 0:
+                self.plot_traces(var_name, traces)
 
         conf_exp = st.expander("Config")
         if len(selected_logs) == 0:
@@ -145,29 +215,13 @@ class JobInspector(Page):
             column.text(f"{log.name} ({log.started})")
             column.code(yaml.dump(log.config), language="yaml")
 
-        stdout_exp = st.expander("Stdout")
-        cols = stdout_exp.columns(len(selected_logs))
-        for log, column in zip(selected_logs, cols):
-            column.text(f"{log.name} ({log.started})")
-            with column:
-                stx.scrollableTextbox(
-                    log.get_stdout(),
-                    height=400,
-                    fontFamily="monospace",
-                    key=log.folder_name + "_stdout",
-                )
-
-        stderr_exp = st.expander("Stderr")
-        cols = stderr_exp.columns(len(selected_logs))
-        for log, column in zip(selected_logs, cols):
-            column.text(f"{log.name} ({log.started})")
-            with column:
-                stx.scrollableTextbox(
-                    log.get_stderr(),
-                    height=400,
-                    fontFamily="monospace",
-                    key=log.folder_name + "_stderr",
-                )
+        for output in ["stdout", "stderr"]:
+            output_exp = st.expander(output.capitalize())
+            cols = output_exp.columns(len(selected_logs))
+            for log, column in zip(selected_logs, cols):
+                column.text(f"{log.name} ({log.started})")
+                with column:
+                    self.show_output(log, output)
 
         rename_exp = st.expander("Rename")
         cols = rename_exp.columns(len(selected_logs))
@@ -187,14 +241,179 @@ class JobInspector(Page):
     def on_leave(self) -> None:
         return super().on_leave()
 
-    def get_expander(self, var_name: str, create_empty: bool = False) -> DeltaGenerator:
-        if var_name not in self.expanders:
-            self.expanders[var_name] = exp = st.expander(var_name, expanded=self.expand_all)
+    @property
+    def cache(self) -> dict[tuple[str, str], Any]:
+        """already loaded series per (run, variable), persistent for this session"""
+        if "inspector_cache" not in st.session_state:
+            st.session_state["inspector_cache"] = {}
+        return st.session_state["inspector_cache"]
+
+    def load_records(
+        self, log: RunLogger, var_name: str, read: Callable[..., np.ndarray]
+    ) -> np.ndarray:
+        """read only the records logged since the last rerun, with read_scalars or read_images"""
+        key = (log.folder_name, var_name)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = read(var_name)
+        else:
+            new_records = read(var_name, start=len(cached))
+            if len(new_records) > 0:
+                cached = np.concatenate([cached, new_records])
+        self.cache[key] = cached
+        return cached
+
+    def load_entries(self, log: RunLogger, var_name: str) -> list[LogEntry]:
+        key = (log.folder_name, var_name)
+        cached = self.cache.get(key, [])
+        cached = cached + log.read_var(var_name, start=len(cached))
+        self.cache[key] = cached
+        return cached
+
+    def drop_cached(self, log: RunLogger) -> None:
+        for key in [k for k in self.cache if k[0] == log.folder_name]:
+            del self.cache[key]
+
+    def show_image(
+        self,
+        var_name: str,
+        log: RunLogger,
+        n_images: int,
+        get_paths: Callable[[int], tuple[Path, Path | None]],
+    ) -> None:
+        """show one of n_images, get_paths returns image and thumbnail path of an image"""
+        exp = self.get_expander(var_name)
+        # select index
+        if n_images > 1:
+            epoch = exp.slider(
+                "Select",
+                min_value=0,
+                label_visibility="hidden",
+                max_value=n_images - 1,
+                value=n_images - 1,
+                key="num_epoch_" + var_name + log.folder_name,
+            )
+        else:
+            epoch = 0
+
+        # show small version first, unless full resolution is requested
+        full_resolution = exp.checkbox(
+            "Full resolution", key="full_res_" + var_name + log.folder_name
+        )
+
+        def choose_path(i: int) -> Path:
+            img_path, thumbnail = get_paths(i)
+            if not full_resolution and thumbnail is not None and thumbnail.exists():
+                return thumbnail
+            return img_path
+
+        # decode neighbours in the background, so scrubbing through images is fast
+        for i in range(epoch - self.PREFETCH, epoch + self.PREFETCH + 1):
+            if i != epoch and 0 <= i < n_images:
+                _prefetch_pool.submit(load_image, str(choose_path(i)))
+
+        img_path = choose_path(epoch)
+        if not img_path.exists():
+            exp.caption(f"{log.display_name}: image is still being written...")
+            return
 
-            if create_empty:
-                with exp:
-                    container = st.empty()
-                # overwrite to internal container
-                self.expanders[var_name] = container
+        exp.image(load_image(str(img_path)), caption=f"{log.display_name}")
 
+    def show_vectors(self, var_name: str, log: RunLogger, records: np.ndarray) -> None:
+        exp = self.get_expander(var_name)
+        n_rows = len(records)
+        max_rows = self.MAX_RIDGES if self.vector_style == "Ridgeline" else self.n_points
+        # evenly spaced selection of rows, the latest one is always included
+        rows = np.unique(np.linspace(0, n_rows - 1, min(n_rows, max_rows)).astype(int))
+        data = np.asarray(log.vector_data(var_name, n_rows)[rows])
+        if data.shape[1] == 0:
+            exp.caption(f"{log.display_name}: all vectors are empty")
+            return
+        if self.use_time:
+            steps = to_datetime64(records["t"][rows])
+        else:
+            steps = records["index"][rows]
+
+        fig = go.Figure()
+        if self.vector_style == "Heatmap":
+            fig.add_trace(go.Heatmap(z=data, y=steps, x=np.arange(data.shape[1])))
+            fig.update_yaxes(title="time" if self.use_time else "index")
+        else:
+            # stack rows vertically, with the latest row on top
+            spacing = max(float(np.ptp(data)), 1e-12) * 0.5
+            for k, (step, row) in enumerate(zip(steps, data)):
+                fig.add_scatter(
+                    x=np.arange(len(row)), y=row + k * spacing, name=str(step), showlegend=False
+                )
+            fig.update_yaxes(
+                tickvals=np.arange(len(rows)) * spacing, ticktext=[str(s) for s in steps]
+            )
+        fig.update_layout(title=log.display_name)
+        exp.plotly_chart(fig, key="vectors_" + var_name + log.folder_name)
+
+    def show_output(self, log: RunLogger, output: str) -> None:
+        """paginated view of stdout or stderr, starting with the latest output"""
+        path = log.stdout_file if output == "stdout" else log.stderr_file
+        if not path.exists():
+            return
+        n_pages = output_file.n_pages(path, self.OUTPUT_PAGE_SIZE)
+        page = 0
+        if n_pages > 1:
+            page = st.number_input(
+                "Pages before latest",
+                min_value=0,
+                max_value=n_pages - 1,
+                value=0,
+                key=log.folder_name + "_" + output + "_page",
+            )
+        stx.scrollableTextbox(
+            output_file.read_page(path, page, self.OUTPUT_PAGE_SIZE),
+            height=400,
+            fontFamily="monospace",
+            key=log.folder_name + "_" + output,
+        )
+
+    def plot_traces(
+        self, var_name: str, traces: list[tuple[RunLogger, np.ndarray, np.ndarray]]
+    ) -> None:
+        exp = self.get_expander(var_name)
+
+        # zoom by choosing the visible range, which is then shown in full resolution
+        lo = min(x.min() for _, x, _ in traces)
+        hi = max(x.max() for _, x, _ in traces)
+        if lo < hi:
+            is_time = np.issubdtype(lo.dtype, np.datetime64)
+            visible = exp.slider(
+                "Visible range",
+                min_value=lo.astype(datetime) if is_time else int(lo),
+                max_value=hi.astype(datetime) if is_time else int(hi),
+                value=(lo.astype(datetime), hi.astype(datetime)) if is_time else (int(lo), int(hi)),
+                step=timedelta(seconds=1) if is_time else 1,
+                label_visibility="collapsed",
+                key="visible_range_" + var_name,
+            )
+            lo, hi = (np.datetime64(v) for v in visible) if is_time else visible
+
+        plotted = []
+        for log, x, y in traces:
+            if y.ndim == 1:
+                visible_points = (x >= lo) & (x <= hi)
+                x, y = downsample_minmax(x[visible_points], y[visible_points], self.n_points)
+            plotted.append((log, x, y))
+
+        # WebGL renders many points much faster than SVG
+        n_points = sum(len(x) for _, x, _ in plotted)
+        trace_type = go.Scattergl if n_points > self.WEBGL_THRESHOLD else go.Scatter
+
+        fig = go.Figure()
+        for log, x, y in plotted:
+            fig.add_trace(trace_type(x=x, y=y, name=log.display_name, showlegend=True))
+        if self.log_axes:
+            fig.update_yaxes(type="log")
+        fig.update_layout(legend=dict(orientation="h"))
+        exp.plotly_chart(fig, key="plot_" + var_name)  # unique key
+
+    def get_expander(self, var_name: str) -> DeltaGenerator:
+        if var_name not in self.expanders:
+            self.expanders[var_name] = st.expander(var_name, expanded=self.expand_all)
         return self.expanders[var_name]
@@ -1,9 +1,12 @@
 import streamlit as st
 import streamlit_ace as st_ace  # type: ignore
 import pathlib
+import threading
 import datetime
+from typing import Any
 import yaml
 import cvde
+from cvde.resources import ResourceRequest
 from .page import Page
 import wonderwords
 
@@ -21,6 +24,9 @@ class Launcher(Page):
     def __init__(self) -> None:
         if "last_submitted" not in st.session_state:
             st.session_state.last_submitted = None
+        if "submit_errors" not in st.session_state:
+            # of submissions in background threads, shown by the GUI
+            st.session_state.submit_errors = []
 
     def run(self) -> None:
         if not cvde.Workspace().git_tracking_enabled:
@@ -83,6 +89,29 @@ class Launcher(Page):
                 for key, value in [word.split("=") for word in env_string.split(";")]
             }
 
+            # choose resources
+            st.markdown("Resources")
+            c1, c2, c3 = st.columns(3)
+            n_gpus = c1.number_input(
+                "GPUs",
+                min_value=0,
+                key="launcher_n_gpus",
+                help="Number of GPUs. The job waits until they are free and gets them assigned in CUDA_VISIBLE_DEVICES.",
+            )
+            n_cpus = c2.number_input(
+                "CPU cores",
+                min_value=0,
+                key="launcher_n_cpus",
+                help="Number of CPU cores. The job waits until they are free and is pinned to them.",
+            )
+            memory_gb = c3.number_input(
+                "RAM (GB)",
+                min_value=0.0,
+                key="launcher_memory_gb",
+                help="Memory the job needs. It waits until enough memory is free.",
+            )
+            resources = ResourceRequest(int(n_gpus), int(n_cpus), float(memory_gb))
+
             # choose run name
             # now = datetime.datetime.now().strftime("%Y%m%d_%H%M")
             # default_run_name = f"{now}_{job_name}_{config_name}"
@@ -134,6 +163,12 @@ class Launcher(Page):
                 help="Choose jobs to wait for before starting this one. Otherwise the job will be launched immediately and parallel to other jobs.",
             )
 
+            capture_fds = st.checkbox(
+                "Capture native output",
+                key="launcher_capture_fds",
+                help="Also save output of C/C++ extensions (e.g. TensorFlow, CUDA), by redirecting stdout and stderr of the job process. The terminal shows it rate limited.",
+            )
+
             submit = st.button("Submit", use_container_width=True, type="primary")
 
         if config_name is None:
@@ -157,18 +192,59 @@ class Launcher(Page):
             return
 
         if submit:
-            submission = cvde.job.JobSubmission(
-                config=config,
-                job_name=job_name,
-                run_name=run_name,
-                tags=tags,
-                env=env,
-            )
-            st.session_state.last_submitted = submission
-
-            scheduler.submit(submission, after)
-            cvde.gui.notify(f"{run_name} submitted.")
+            from cvde.sweep import make_submissions
+
+            try:
+                # several submissions, if the config defines a sweep
+                submissions = make_submissions(
+                    config=config,
+                    job_name=job_name,
+                    run_name=run_name,
+                    tags=tags,
+                    env=env,
+                    resources=resources,
+                    capture_fds=capture_fds,
+                )
+            except (ValueError, TypeError) as e:
+                st.error(f"Invalid sweep: {e}")
+                return
+            st.session_state.last_submitted = submissions[-1]
+            for submission in submissions:
+                st.session_state.tags.update(submission.tags)
+
+            if isinstance(scheduler, cvde.Scheduler):
+                try:
+                    scheduler.submit_many(submissions, after)
+                except ValueError as e:
+                    st.error(str(e))
+                    return
+            else:
+                # sending the submissions to `cvde scheduler` waits for the capture of the code
+                threading.Thread(
+                    target=submit_in_background,
+                    args=(scheduler, submissions, after, st.session_state.submit_errors),
+                    daemon=True,
+                ).start()
+            if len(submissions) > 1:
+                cvde.gui.notify(f"Sweep {run_name} with {len(submissions)} runs submitted.")
+            else:
+                cvde.gui.notify(f"{run_name} submitted.")
             st.rerun()
 
     def on_leave(self) -> None:
         return super().on_leave()
+
+
+def submit_in_background(
+    scheduler: Any,
+    submissions: list["cvde.job.JobSubmission"],
+    after: list["cvde.job.JobSubmission"],
+    errors: list[str],
+) -> None:
+    """submit to `cvde scheduler`, errors are appended to errors and shown by the GUI"""
+    try:
+        scheduler.submit_many(submissions, after)
+    except Exception as e:
+        names = ", ".join(submission.run_name for submission in submissions)
+        errors.append(f"Could not submit {names}: {e}")
+        cvde.gui.update_gui_from_thread()
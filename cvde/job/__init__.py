@@ -1,5 +1,6 @@
 from .job_submission import JobSubmission
 from .job import Job
 from .run_logger import RunLogger
+from .run_catalog import RunCatalog
 
-__all__ = ["RunLogger", "Job", "JobSubmission"]
+__all__ = ["RunLogger", "RunCatalog", "Job", "JobSubmission"]
@@ -0,0 +1,81 @@
+"""Capture of the state of the code in the workspace when a job is submitted.
+
+The working tree, including untracked files that are not ignored, is written as a tree
+into the repository using a temporary index, so the index of the user is not modified.
+The tree is committed on top of HEAD into the hidden ref refs/cvde/snapshots/<tree>,
+which keeps it from being garbage collected. Submitting again without changes reuses the
+commit of the same tree.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+SNAPSHOT_REF = "refs/cvde/snapshots/"
+
+# captures run one after another, they write to the same repository
+_capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="code_capture")
+
+
+@dataclass
+class CodeState:
+    commit: str  # HEAD at the time of the capture
+    diff: str  # of the working tree to commit
+    snapshot_commit: str  # commit with the complete working tree
+
+
+def capture_async(repo: Path = Path(".")) -> Future:
+    """capture the state of the code in a background thread, returns a Future[CodeState]"""
+    return _capture_pool.submit(capture, repo.resolve())
+
+
+def capture(repo: Path = Path(".")) -> CodeState:
+    def git(*args: str, env: dict[str, str] | None = None) -> str:
+        result = subprocess.run(["git", *args], cwd=repo, env=env, capture_output=True)
+        result.check_returncode()
+        return result.stdout.decode().strip()
+
+    commit = git("rev-parse", "HEAD")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_file = Path(tmp) / "index"
+        # starting from the index of the user, git add only hashes files that changed
+        user_index = repo / git("rev-parse", "--git-path", "index")
+        if user_index.exists():
+            shutil.copyfile(user_index, index_file)
+        env = {**os.environ, "GIT_INDEX_FILE": str(index_file)}
+        git("add", "-A", env=env)
+        tree = git("write-tree", env=env)
+
+    if tree == git("rev-parse", "HEAD^{tree}"):
+        return CodeState(commit, diff="", snapshot_commit=commit)
+
+    diff = subprocess.run(
+        ["git", "diff", "--no-color", commit, tree], cwd=repo, capture_output=True
+    ).stdout.decode(errors="replace")  # only kept as a record, the snapshot is the commit
+
+    ref = SNAPSHOT_REF + tree
+    existing = subprocess.run(
+        ["git", "rev-parse", "--quiet", "--verify", ref + "^{commit}"],
+        cwd=repo,
+        capture_output=True,
+    )
+    if existing.returncode == 0:
+        # same working tree as a previous submission
+        return CodeState(commit, diff, snapshot_commit=existing.stdout.decode().strip())
+
+    identity = {
+        "GIT_AUTHOR_NAME": "cvde",
+        "GIT_AUTHOR_EMAIL": "cvde@localhost",
+        "GIT_COMMITTER_NAME": "cvde",
+        "GIT_COMMITTER_EMAIL": "cvde@localhost",
+    }
+    snapshot_commit = git(
+        "commit-tree", tree, "-p", commit, "-m", "cvde snapshot", env={**os.environ, **identity}
+    )
+    git("update-ref", ref, snapshot_commit)
+    return CodeState(commit, diff, snapshot_commit)
@@ -0,0 +1,169 @@
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import psutil
+
+from .run_logger import (
+    RunLogger,
+    LogEntry,
+    SCALAR_FILE,
+    SCALAR_DTYPE,
+    IMAGE_FILE,
+    IMAGE_DTYPE,
+    IMAGE_FORMATS,
+    VECTOR_FILE,
+    VECTOR_INDEX_FILE,
+    VECTOR_DTYPE,
+    is_numeric,
+)
+
+SUFFIX_FORMATS = {".png": "png", ".jpg": "jpeg", ".webp": "webp"}
+
+
+@dataclass
+class CompactResult:
+    folder_name: str
+    files_before: int = 0
+    files_after: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    converted_vars: list[str] = field(default_factory=list)
+    skipped: bool = False  # runs in progress are not compacted
+    errors: list[str] = field(default_factory=list)
+
+
+def count_files(folder: Path) -> tuple[int, int]:
+    """number of files and their total size in bytes"""
+    n_files = n_bytes = 0
+    for root, _, files in os.walk(folder):
+        for file in files:
+            n_files += 1
+            n_bytes += os.path.getsize(os.path.join(root, file))
+    return n_files, n_bytes
+
+
+def is_running(log: RunLogger) -> bool:
+    if log.read_status() is None:
+        # runs of older versions have no heartbeat and the caller did not spawn the job
+        return log.status in ["running", "unknown"] and psutil.pid_exists(log.pid)
+    return log.is_in_progress()
+
+
+def compact_run(folder_name: str) -> CompactResult:
+    """Convert the pickle-per-step variables of a finished run to the packed formats of
+    RunLogger. Each variable is verified to read back identically, otherwise its pickles
+    are restored."""
+    result = CompactResult(folder_name)
+    log = RunLogger.from_log(folder_name)
+
+    if not log.var_root.exists():
+        return result
+
+    result.files_before, result.bytes_before = count_files(log.var_root)
+
+    for var_folder in sorted(log.var_root.iterdir()):
+        if not var_folder.is_dir() or not any(var_folder.glob("*.pkl")):
+            continue
+        try:
+            if compact_var(log, var_folder.name):
+                result.converted_vars.append(var_folder.name)
+        except Exception as e:
+            result.errors.append(f"{var_folder.name}: {e}")
+
+    result.files_after, result.bytes_after = count_files(log.var_root)
+    return result
+
+
+def compact_var(log: RunLogger, var: str) -> bool:
+    """returns False, if the entries of var can not be stored in a packed format"""
+    var_folder = log.var_root / var
+    if any((var_folder / f).exists() for f in [SCALAR_FILE, IMAGE_FILE, VECTOR_INDEX_FILE]):
+        return False  # mixed layout, writing packed files would overwrite entries
+
+    entries = log.read_var(var)
+    packed = pack_entries(entries)
+    if packed is None:
+        return False
+    file_names, buffers = packed
+
+    backup = log.root / ".compact_backup" / var
+    backup.mkdir(parents=True, exist_ok=True)
+    pickles = sorted(var_folder.glob("*.pkl"))
+
+    for file_name, buffer in zip(file_names, buffers):
+        with (var_folder / file_name).open("wb") as F:
+            F.write(buffer)
+    for pickle_file in pickles:
+        pickle_file.rename(backup / pickle_file.name)
+
+    if entries_equal(entries, log.read_var(var)):
+        shutil.rmtree(backup)
+        if not any(backup.parent.iterdir()):
+            backup.parent.rmdir()
+        return True
+
+    # restore legacy layout
+    for file_name in file_names:
+        (var_folder / file_name).unlink()
+    for pickle_file in pickles:
+        (backup / pickle_file.name).rename(pickle_file)
+    shutil.rmtree(backup)
+    raise ValueError("packed entries do not match the original entries")
+
+
+def pack_entries(entries: list[LogEntry]) -> tuple[list[str], list[bytes]] | None:
+    """returns file names and contents of the packed representation of entries"""
+    if len(entries) == 0:
+        return None
+    data = [e.data for e in entries]
+
+    if all(e.is_image for e in entries):
+        image_records: list[tuple[int, float, int, bool]] = []
+        for e in entries:
+            img_path = Path(e.data)
+            if img_path.name != f"{e.index:06}{img_path.suffix}":
+                return None  # image files are named after their index in the packed format
+            if img_path.suffix not in SUFFIX_FORMATS:
+                return None
+            image_format = IMAGE_FORMATS.index(SUFFIX_FORMATS[img_path.suffix])
+            has_thumbnail = e.thumbnail is not None and Path(e.thumbnail).exists()
+            image_records.append((e.index, e.t.timestamp(), image_format, has_thumbnail))
+        return [IMAGE_FILE], [np.array(image_records, dtype=IMAGE_DTYPE).tobytes()]
+
+    if any(e.is_image for e in entries) or not all(is_numeric(d) for d in data):
+        return None
+
+    if all(np.ndim(d) == 0 for d in data):
+        scalar_records = [(e.index, e.t.timestamp(), float(e.data)) for e in entries]
+        return [SCALAR_FILE], [np.array(scalar_records, dtype=SCALAR_DTYPE).tobytes()]
+
+    if all(np.ndim(d) == 1 for d in data) and len({len(d) for d in data}) == 1:
+        rows = np.stack([np.asarray(d, dtype="<f8") for d in data])
+        vector_records = [(e.index, e.t.timestamp(), rows.shape[1]) for e in entries]
+        return [VECTOR_FILE, VECTOR_INDEX_FILE], [
+            rows.tobytes(),
+            np.array(vector_records, dtype=VECTOR_DTYPE).tobytes(),
+        ]
+
+    return None
+
+
+def entries_equal(before: list[LogEntry], after: list[LogEntry]) -> bool:
+    if len(before) != len(after):
+        return False
+    for a, b in zip(before, after):
+        # timestamps are stored as float seconds
+        if a.index != b.index or abs((a.t - b.t).total_seconds()) > 1e-3:
+            return False
+        if a.is_image != b.is_image:
+            return False
+        if a.is_image:
+            # legacy entries store absolute paths, which are outdated if log/ was moved
+            if Path(a.data).name != Path(b.data).name:
+                return False
+        elif not np.array_equal(np.asarray(a.data, dtype="<f8"), np.asarray(b.data)):
+            return False
+    return True
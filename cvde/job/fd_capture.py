@@ -0,0 +1,147 @@
+import codecs
+import ctypes
+import os
+import sys
+import threading
+from pathlib import Path
+
+import colorama
+
+from .output_file import RotatingFile
+
+
+class FdCapture:
+    """Redirects the file descriptors of stdout and stderr of the current process into
+    output files, so that output of C/C++ extensions (e.g. TensorFlow, CUDA, OpenCV) is
+    captured as well. Each fd is replaced by a pipe, which is drained by a reader thread.
+
+    Optionally the output is mirrored to the original terminal. The mirror is written at
+    most every mirror_interval seconds and only the latest mirror_max_bytes since the last
+    write are shown, so that a chatty job can not slow down the terminal. The output files
+    always receive the complete output."""
+
+    READ_SIZE = 1 << 16
+
+    def __init__(
+        self,
+        stdout_file: Path,
+        stderr_file: Path,
+        head_bytes: int = RotatingFile.HEAD_BYTES,
+        tail_bytes: int = RotatingFile.TAIL_BYTES,
+        mirror: bool = True,
+        mirror_interval: float = 0.5,
+        mirror_max_bytes: int = 1 << 14,
+        color: str = "",
+    ) -> None:
+        self.targets = {1: stdout_file, 2: stderr_file}
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.mirror = mirror
+        self.mirror_interval = mirror_interval
+        self.mirror_max_bytes = mirror_max_bytes
+        self.color = color
+
+        self._saved_fds: dict[int, int] = {}
+        self._readers: list[threading.Thread] = []
+        self._pending: dict[int, bytearray] = {1: bytearray(), 2: bytearray()}
+        self._n_skipped = {1: 0, 2: 0}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._mirror_thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        assert len(self._saved_fds) == 0, "capture already started"
+        flush_all()
+        for fd, path in self.targets.items():
+            self._saved_fds[fd] = os.dup(fd)
+            read_fd, write_fd = os.pipe()
+            os.dup2(write_fd, fd)
+            os.close(write_fd)
+            file = RotatingFile(path, self.head_bytes, self.tail_bytes)
+            reader = threading.Thread(target=self._read, args=(fd, read_fd, file), daemon=True)
+            reader.start()
+            self._readers.append(reader)
+
+        if self.mirror:
+            self._mirror_thread = threading.Thread(target=self._mirror_loop, daemon=True)
+            self._mirror_thread.start()
+
+    def stop(self) -> None:
+        """restore the original fds and wait until the pipes are drained"""
+        if len(self._saved_fds) == 0:
+            return
+        flush_all()
+        for fd, saved_fd in self._saved_fds.items():
+            # closes the write end of the pipe, the reader reads until EOF
+            os.dup2(saved_fd, fd)
+        for reader in self._readers:
+            # children that inherited the fds can keep the pipe open
+            reader.join(timeout=5.0)
+
+        self._stopped.set()
+        if self._mirror_thread is not None:
+            self._mirror_thread.join()
+        self._write_mirror()
+
+        for saved_fd in self._saved_fds.values():
+            os.close(saved_fd)
+        self._saved_fds.clear()
+        self._readers.clear()
+
+    def _read(self, fd: int, read_fd: int, file: RotatingFile) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            while True:
+                data = os.read(read_fd, self.READ_SIZE)
+                if len(data) == 0:
+                    break
+                file.write(decoder.decode(data))
+                file.flush()
+                if self.mirror:
+                    with self._lock:
+                        self._pending[fd] += data
+            file.write(decoder.decode(b"", final=True))
+        finally:
+            file.close()
+            os.close(read_fd)
+
+    def _mirror_loop(self) -> None:
+        while not self._stopped.wait(self.mirror_interval):
+            self._write_mirror()
+
+    def _write_mirror(self) -> None:
+        """write pending output to the terminal, coalesced to its latest mirror_max_bytes"""
+        with self._lock:
+            pending: dict[int, bytes] = {fd: bytes(data) for fd, data in self._pending.items()}
+            for buffer in self._pending.values():
+                buffer.clear()
+
+        for fd, data in pending.items():
+            if len(data) > self.mirror_max_bytes:
+                self._n_skipped[fd] += len(data) - self.mirror_max_bytes
+                data = data[-self.mirror_max_bytes :]
+            if len(data) == 0 or fd not in self._saved_fds:
+                continue
+            if self._n_skipped[fd] > 0:
+                data = f"[... {self._n_skipped[fd]} bytes only in the log ...]\n".encode() + data
+                self._n_skipped[fd] = 0
+            if len(self.color) > 0:
+                data = (self.color + data.decode(errors="replace") + colorama.Fore.RESET).encode()
+            write_fully(self._saved_fds[fd], data)
+
+
+def flush_all() -> None:
+    """flush python and C stdio buffers, so that no output is written to the wrong fd"""
+    for stream in [sys.__stdout__, sys.__stderr__, sys.stdout, sys.stderr]:
+        if stream is not None:
+            stream.flush()
+    try:
+        ctypes.CDLL(None).fflush(None)
+    except (OSError, AttributeError):
+        pass  # no C library available, e.g. on Windows
+
+
+def write_fully(fd: int, data: bytes) -> None:
+    while len(data) > 0:
+        n_written = os.write(fd, data)
+        data = data[n_written:]
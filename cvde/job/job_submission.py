@@ -1,7 +1,11 @@
-import subprocess
-from dataclasses import dataclass
-from typing import Any
+import uuid
+from concurrent.futures import Future
+from dataclasses import InitVar, dataclass, field
+from typing import Any, Callable
 import cvde
+from cvde.early_stopping import EarlyStopping
+from cvde.resources import ResourceRequest
+from .code_capture import CodeState, capture_async
 
 
 @dataclass
@@ -13,21 +17,63 @@ class JobSubmission:
     env: dict[str, str]
     diff: str | None = None
     commit: str | None = None
+    # commit of the complete working tree, in which the job is run
+    snapshot_commit: str | None = None
+    resources: ResourceRequest = field(default_factory=ResourceRequest)
+    # redirect the stdout, stderr fds of the job process, to capture output of native code
+    capture_fds: bool = False
+    # show captured output in the terminal, rate limited
+    mirror_output: bool = True
+    # id of the sweep the submission belongs to, see cvde.sweep.make_submissions
+    sweep: str | None = None
+    # max. number of submissions of the sweep that run at the same time
+    max_concurrent: int | None = None
+    # stop the submission early, if its metric is worse than that of the rest of the sweep
+    early_stopping: EarlyStopping | None = None
+    # identifies the submission in the persistent job queue
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # capture of the code that is shared with other submissions, e.g. of a sweep
+    code_capture: InitVar[Future | None] = None
 
-    def __post_init__(self) -> None:
+    def __post_init__(self, code_capture: Future | None) -> None:
+        self._capture: Future | None = None
         if not cvde.Workspace().git_tracking_enabled:
             return
-        subprocess.run(["git", "add", "-A"], capture_output=True)
-        self.diff = subprocess.run(
-            ["git", "diff", "HEAD", "--no-color"], capture_output=True
-        ).stdout.decode()
-        subprocess.run(["git", "reset", "HEAD"])
-
-        self.commit = (
-            subprocess.run("git rev-parse HEAD".split(), capture_output=True)
-            .stdout.decode()
-            .strip()
-        )
+        if self.commit is not None:
+            return  # state of the code was already captured
+        # in the background, so that submitting does not block the GUI
+        self._capture = code_capture or capture_async()
+
+    def wait_for_capture(self) -> None:
+        """block until the state of the code is captured, raises if the capture failed"""
+        if self._capture is None:
+            return
+        state: CodeState = self._capture.result()
+        self.commit = state.commit
+        self.diff = state.diff
+        self.snapshot_commit = state.snapshot_commit
+        self._capture = None
+
+    def on_captured(self, callback: Callable[[], None]) -> None:
+        """call callback once the state of the code is captured (or the capture failed)"""
+        if self._capture is None:
+            callback()
+        else:
+            self._capture.add_done_callback(lambda _: callback())
+
+    def __getstate__(self) -> dict[str, Any]:
+        # submissions are pickled for job processes and the job queue
+        self.wait_for_capture()
+        state = self.__dict__.copy()
+        del state["_capture"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._capture = None
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, JobSubmission) and other.id == self.id
 
     def __hash__(self) -> int:
-        return hash(self.run_name)
+        return hash(self.id)
@@ -0,0 +1,224 @@
+"""Captured output (stdout.txt, stderr.txt) of a run.
+
+To limit disk usage, RotatingFile compresses the output into segments named
+<file>.<start>-<end>.gz, where start and end are byte offsets in the complete output.
+Only the first and the last segments are kept. The current output is appended to the
+file itself. The readers in this module present the segments and the file as one text,
+in which dropped output is replaced by a note.
+"""
+
+import codecs
+import gzip
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import TextIO
+
+
+class RotatingFile:
+    """append-only text file, that is rotated into compressed segments when it grows
+    larger than segment_bytes. Keeps the first head_bytes and the last tail_bytes."""
+
+    HEAD_BYTES = 16 << 20
+    TAIL_BYTES = 64 << 20
+    SEGMENT_BYTES = 8 << 20
+    # smaller segments would be compressed and listed for every few writes
+    MIN_SEGMENT_BYTES = 1 << 20
+
+    def __init__(
+        self,
+        path: Path,
+        head_bytes: int = HEAD_BYTES,
+        tail_bytes: int = TAIL_BYTES,
+        segment_bytes: int = SEGMENT_BYTES,
+    ) -> None:
+        self.path = path
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        # the limits are kept with the granularity of a segment, the current file keeps
+        # up to segment_bytes of tail even for tail_bytes=0
+        self.segment_bytes = max(segment_bytes, self.MIN_SEGMENT_BYTES)
+        self._start = current_start(path)
+        self._file: TextIO = path.open("a", buffering=1)
+        # characters written since the last size check, to avoid a stat per write
+        self._unchecked = 0
+        self._size = path.stat().st_size
+        # any thread of the job prints, rotate must not close the file under a write;
+        # reentrant for a signal handler that prints during a write
+        self._lock = threading.RLock()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, value: str) -> int:
+        with self._lock:
+            n_written = self._file.write(value)
+            self._unchecked += len(value)
+            # a character is at least one byte in utf-8
+            if self._size + self._unchecked >= self.segment_bytes:
+                self._file.flush()
+                self._size = self.path.stat().st_size
+                self._unchecked = 0
+                if self._size >= self.segment_bytes:
+                    self.rotate()
+            return n_written
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def rotate(self) -> None:
+        with self._lock:
+            self._file.close()
+            end = self._start + self.path.stat().st_size
+            segment = self.path.with_name(f"{self.path.name}.{self._start:012}-{end:012}.gz")
+            tmp_segment = segment.with_name("." + segment.name)
+            with self.path.open("rb") as src, gzip.open(tmp_segment, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            tmp_segment.replace(segment)
+            self._file = self.path.open("w", buffering=1)
+            self._start = end
+            self._size = 0
+            self._drop_segments()
+
+    def _drop_segments(self) -> None:
+        """delete segments between the first head_bytes and the last tail_bytes"""
+        tail_size = 0
+        # the newest segment is always kept, its name is the offset of the current file
+        for start, end, segment in reversed(segments(self.path)[:-1]):
+            if start < self.head_bytes:
+                break
+            tail_size += end - start
+            if tail_size > self.tail_bytes:
+                segment.unlink()
+
+
+def segments(path: Path) -> list[tuple[int, int, Path]]:
+    """compressed segments of path as (start, end, segment path), sorted by start"""
+    pattern = re.compile(re.escape(path.name) + r"\.([0-9]+)-([0-9]+)\.gz")
+    found = []
+    for segment in path.parent.glob(path.name + ".*.gz"):
+        match = pattern.fullmatch(segment.name)
+        if match is not None:
+            found.append((int(match.group(1)), int(match.group(2)), segment))
+    return sorted(found)
+
+
+def current_start(path: Path) -> int:
+    """offset of the content of path in the complete output"""
+    found = segments(path)
+    return found[-1][1] if len(found) > 0 else 0
+
+
+def pieces(path: Path) -> list[tuple[int, int, Path]]:
+    """segments and the current file as (start, end, path)"""
+    start = current_start(path)
+    size = path.stat().st_size if path.exists() else 0
+    return segments(path) + [(start, start + size, path)]
+
+
+def read_bytes(path: Path, start: int, n_bytes: int) -> tuple[bytes, int]:
+    """n_bytes of kept output from offset start on, with notes about dropped output.
+    Returns the data and the offset to continue reading from."""
+    parts = []
+    position = start
+    for piece_start, piece_end, piece_path in pieces(path):
+        if piece_end <= position or n_bytes <= 0:
+            continue
+        if piece_start > position:
+            parts.append(f"\n[... {piece_start - position} bytes dropped ...]\n".encode())
+            position = piece_start
+        opener = gzip.open if piece_path.suffix == ".gz" else open
+        with opener(piece_path, "rb") as F:
+            F.seek(position - piece_start)
+            data = F.read(min(n_bytes, piece_end - position))
+        parts.append(data)
+        position += len(data)
+        n_bytes -= len(data)
+    return b"".join(parts), position
+
+
+def size(path: Path) -> int:
+    """size of the complete output in bytes, including dropped output"""
+    return pieces(path)[-1][1]
+
+
+def decode(data: bytes) -> tuple[str, int]:
+    """decode utf-8, returns the text and the number of used bytes. An incomplete character
+    at the end (e.g. of a file that is still being written) is not used."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    text = decoder.decode(data, final=False)
+    pending, _ = decoder.getstate()
+    return text, len(data) - len(pending)
+
+
+def read_all(path: Path) -> str:
+    data, _ = read_bytes(path, 0, size(path))
+    return data.decode("utf-8", errors="replace")
+
+
+def read_chunk(path: Path, offset: int = 0, max_bytes: int = 1 << 20) -> tuple[str, int]:
+    """Read at most max_bytes of text starting at byte offset. Returns the text and the
+    offset to continue reading from, so that live outputs can be read incrementally."""
+    data, position = read_bytes(path, offset, max_bytes)
+    text, n_used = decode(data)
+    return text, position - (len(data) - n_used)
+
+
+def tail(path: Path, n_lines: int = 10, max_bytes: int = 1 << 20) -> str:
+    """Last n_lines of the output, but at most its last max_bytes. Only reads the end of
+    the current file, by seeking backwards in blocks."""
+    block_size = 8192
+    with path.open("rb") as F:
+        end = F.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+        # a trailing newline does not start a new line
+        while position > 0 and data.count(b"\n", 0, len(data) - 1) < n_lines:
+            if end - position >= max_bytes:
+                break
+            step = min(block_size, position, max_bytes - (end - position))
+            position -= step
+            F.seek(position)
+            data = F.read(step) + data
+
+    has_more = position == 0 and end < max_bytes and current_start(path) > 0
+    if has_more and data.count(b"\n", 0, len(data) - 1) < n_lines:
+        # the output was rotated recently, continue in the segments
+        data, _ = read_bytes(path, max(0, size(path) - max_bytes), max_bytes)
+
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    if lines[-1] == "":
+        lines = lines[:-1]
+    return "\n".join(lines[-n_lines:])
+
+
+def read_page(path: Path, page: int, page_size: int = 1 << 16) -> str:
+    """page_size bytes of kept output, counted in pages from the end (page 0 is the last)"""
+    # map pages to the kept output, so dropped output does not produce empty pages
+    kept = [(start, end) for start, end, _ in pieces(path)]
+    n_kept = sum(end - start for start, end in kept)
+    first = max(0, n_kept - (page + 1) * page_size)
+    last = max(0, n_kept - page * page_size)
+
+    def to_offset(kept_position: int) -> int:
+        for start, end in kept:
+            if kept_position < end - start:
+                return start + kept_position
+            kept_position -= end - start
+        return kept[-1][1]
+
+    data, _ = read_bytes(path, to_offset(first), last - first)
+    return data.decode("utf-8", errors="replace")
+
+
+def n_pages(path: Path, page_size: int = 1 << 16) -> int:
+    n_kept = sum(end - start for start, end, _ in pieces(path))
+    return max(1, -(-n_kept // page_size))
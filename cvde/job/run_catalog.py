@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+
+class RunCatalog:
+    """Index of the runs in log/ with their metadata, tags, status and variable names.
+    Listing runs from the catalog avoids opening every run folder. It is updated by
+    RunLogger and can be rebuilt from the run folders with `cvde rebuild-catalog`."""
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS runs (
+            folder_name TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            job TEXT NOT NULL,
+            started TEXT NOT NULL,
+            pid INTEGER NOT NULL,
+            tags TEXT NOT NULL,
+            status TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS vars (
+            folder_name TEXT NOT NULL,
+            var TEXT NOT NULL,
+            PRIMARY KEY (folder_name, var)
+        )""",
+    ]
+
+    def __init__(self, log_dir: Path = Path("log")) -> None:
+        # job processes change into the workspace of their run, so RunLogger passes the
+        # absolute log dir of the run
+        self.log_dir = log_dir.resolve()
+        self.path = self.log_dir / "catalog.sqlite"
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.log_dir.mkdir(exist_ok=True)
+        # the timeout allows job processes and the GUI to write concurrently
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, folder_name: str, meta: dict[str, Any], status: str) -> None:
+        with self._connect() as conn:
+            self._insert(conn, folder_name, meta, status)
+
+    def update(self, folder_name: str, **fields: Any) -> None:
+        """update name, tags or status of a run"""
+        assert set(fields).issubset({"name", "tags", "status"}), f"Can't update {fields}"
+        if "tags" in fields:
+            fields["tags"] = json.dumps(fields["tags"])
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE runs SET {assignments} WHERE folder_name = ?",
+                [*fields.values(), folder_name],
+            )
+
+    def add_var(self, folder_name: str, var: str) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO vars VALUES (?, ?)", (folder_name, var))
+
+    def remove(self, folder_name: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE folder_name = ?", (folder_name,))
+            conn.execute("DELETE FROM vars WHERE folder_name = ?", (folder_name,))
+
+    def list_runs(self) -> list[dict[str, Any]]:
+        """returns metadata of all runs, as stored in log.json, with status and vars"""
+        self.sync()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT folder_name, name, job, started, pid, tags, status FROM runs"
+            ).fetchall()
+            run_vars: dict[str, list[str]] = {}
+            for folder_name, var in conn.execute("SELECT folder_name, var FROM vars"):
+                run_vars.setdefault(folder_name, []).append(var)
+
+        return [
+            {
+                "folder_name": folder_name,
+                "name": name,
+                "job": job,
+                "started": started,
+                "pid": pid,
+                "tags": json.loads(tags),
+                "status": status,
+                "vars": sorted(run_vars.get(folder_name, [])),
+            }
+            for folder_name, name, job, started, pid, tags, status in rows
+        ]
+
+    def sync(self) -> None:
+        """index run folders missing from the catalog and drop entries of deleted folders.
+        Only lists log/, folders that are already indexed are not opened."""
+        on_disk = set(os.listdir(self.log_dir)) if self.log_dir.exists() else set()
+        with self._connect() as conn:
+            indexed = {row[0] for row in conn.execute("SELECT folder_name FROM runs")}
+            for folder_name in indexed - on_disk:
+                conn.execute("DELETE FROM runs WHERE folder_name = ?", (folder_name,))
+                conn.execute("DELETE FROM vars WHERE folder_name = ?", (folder_name,))
+            for folder_name in on_disk - indexed:
+                self._index_folder(conn, folder_name)
+
+    def rebuild(self) -> int:
+        """rescan all run folders, returns the number of indexed runs"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM runs")
+            conn.execute("DELETE FROM vars")
+            for folder_name in os.listdir(self.log_dir):
+                self._index_folder(conn, folder_name)
+            return conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def _index_folder(self, conn: sqlite3.Connection, folder_name: str) -> None:
+        root = self.log_dir / folder_name
+        try:
+            with (root / "log.json").open() as F:
+                meta = json.load(F)
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            return  # not a run folder
+
+        # finished runs have their final state in status.json
+        try:
+            with (root / "status.json").open() as F:
+                status = json.load(F)["state"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            status = "unknown"
+        if status == "running":
+            status = "unknown"  # can't tell without the heartbeat, which RunLogger checks
+
+        self._insert(conn, folder_name, meta, status)
+        var_root = root / "vars"
+        if var_root.exists():
+            conn.executemany(
+                "INSERT OR IGNORE INTO vars VALUES (?, ?)",
+                [(folder_name, var.name) for var in var_root.iterdir() if var.is_dir()],
+            )
+
+    def _insert(
+        self, conn: sqlite3.Connection, folder_name: str, meta: dict[str, Any], status: str
+    ) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                folder_name,
+                meta["name"],
+                meta["job"],
+                meta["started"],
+                int(meta.get("pid", -1)),
+                json.dumps(meta["tags"]),
+                status,
+            ),
+        )
@@ -1,12 +1,17 @@
 import json
 import multiprocessing as mp
-from multiprocessing.process import BaseProcess
+import os
 import pickle
 from datetime import datetime
 from pathlib import Path
 from dataclasses import dataclass
 import sys
-from typing import Any
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Mapping, Sequence
 import shutil
 import yaml
 
@@ -15,6 +20,70 @@ import numpy as np
 
 import cvde
 from .job_submission import JobSubmission
+from .run_catalog import RunCatalog
+from . import output_file
+from .snapshot import remove_unused_snapshots
+
+# packed, append-only storage for scalars: one fixed-width record per step
+SCALAR_FILE = "scalars.bin"
+SCALAR_DTYPE = np.dtype([("index", "<i8"), ("t", "<f8"), ("value", "<f8")])
+# images are indexed by step in the same way, the image files are named after their index
+IMAGE_FILE = "images.bin"
+IMAGE_FORMATS = ["png", "jpeg", "webp"]
+IMAGE_DTYPE = np.dtype([("index", "<i8"), ("t", "<f8"), ("format", "u1"), ("has_thumbnail", "u1")])
+# 1-D vectors (e.g. per-class metrics, histograms) are rows of one (steps x width) array
+VECTOR_FILE = "vectors.bin"
+VECTOR_INDEX_FILE = "vectors.idx"
+VECTOR_DTYPE = np.dtype([("index", "<i8"), ("t", "<f8"), ("width", "<i8")])
+# index files of the packed formats, by the storage of a variable, see storage_of
+PACKED_FILES = {
+    "scalars": (SCALAR_FILE, SCALAR_DTYPE),
+    "images": (IMAGE_FILE, IMAGE_DTYPE),
+    "vectors": (VECTOR_INDEX_FILE, VECTOR_DTYPE),
+}
+
+
+def read_records(
+    path: Path, dtype: np.dtype, start: int = 0, count: int | None = None
+) -> np.ndarray:
+    """read all (or at most count) complete fixed-width records after the first start records
+    in one go"""
+    with path.open("rb") as F:
+        F.seek(start * dtype.itemsize)
+        buffer = F.read(-1 if count is None else count * dtype.itemsize)
+    # ignore a partially written trailing record of a live run
+    n_records = len(buffer) // dtype.itemsize
+    return np.frombuffer(buffer, dtype=dtype, count=n_records)
+
+
+def is_numeric(var: Any) -> bool:
+    """whether var is stored as floats in the packed files"""
+    dtype = np.asarray(var).dtype
+    return bool(
+        np.issubdtype(dtype, np.integer)
+        or np.issubdtype(dtype, np.floating)
+        or np.issubdtype(dtype, np.bool_)
+    )
+
+
+def storage_of(var: Any) -> str:
+    """packed format of var, or objects for entries that are pickled"""
+    if np.ndim(var) == 0 and is_numeric(var):
+        return "scalars"
+    if np.ndim(var) >= 2:
+        return "images"
+    if np.ndim(var) == 1 and is_numeric(var) and len(var) > 0:
+        return "vectors"
+    return "objects"
+
+
+def to_datetime64(t: np.ndarray) -> np.ndarray:
+    """convert POSIX timestamps to naive local times, as returned by datetime.now()"""
+    if len(t) == 0:
+        return np.array([], dtype="datetime64[us]")
+    offset = datetime.fromtimestamp(t[0]).astimezone().utcoffset()
+    assert offset is not None
+    return ((t + offset.total_seconds()) * 1e6).astype("datetime64[us]")
 
 
 @dataclass
@@ -23,12 +92,56 @@ class LogEntry:
     index: int
     data: Any
     is_image: bool
+    thumbnail: str | None = None
+
+
+@dataclass
+class ImageFormat:
+    """how logged images of a variable are encoded"""
+
+    format: str = "png"
+    quality: int = 90  # ignored for lossless png
+    thumbnail_size: int | None = 256  # max. edge length, None to disable thumbnails
+
+    @property
+    def suffix(self) -> str:
+        return {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}[self.format]
+
+
+def encode_image(
+    im: Image.Image, img_path: Path, image_format: ImageFormat, thumbnail_path: Path | None
+) -> None:
+    if image_format.format == "jpeg" and im.mode not in ["L", "RGB"]:
+        im = im.convert("RGB")
+
+    def save(im: Image.Image, path: Path) -> None:
+        # write to temporary file first, so readers never see partially written images
+        tmp_path = path.with_name("." + path.name)
+        im.save(tmp_path, format=image_format.format, quality=image_format.quality)
+        tmp_path.replace(path)
+
+    save(im, img_path)
+    if thumbnail_path is not None and image_format.thumbnail_size is not None:
+        size = image_format.thumbnail_size
+        im.thumbnail((size, size))
+        save(im, thumbnail_path)
 
 
 class RunLogger:
-    def __init__(self, folder_name: str) -> None:
-        with Path("log/" + folder_name + "/log.json").open("r") as F:
-            meta = json.load(F)
+    # max. number of queued entries the background writer handles at once
+    WRITE_BATCH_SIZE = 1000
+    # number of threads encoding logged images and max. number of images waiting for them
+    IMAGE_WORKERS = 4
+    MAX_PENDING_IMAGES = 32
+    # seconds between heartbeats in status.json and after which a silent run is considered dead
+    HEARTBEAT_INTERVAL = 10.0
+    HEARTBEAT_TIMEOUT = 60.0
+
+    def __init__(self, folder_name: str, meta: dict[str, Any] | None = None) -> None:
+        """meta: metadata as stored in log.json, if already known (e.g. from the RunCatalog)"""
+        if meta is None:
+            with Path("log/" + folder_name + "/log.json").open("r") as F:
+                meta = json.load(F)
 
         self.folder_name = folder_name
         self._name = meta["name"]
@@ -36,18 +149,53 @@ class RunLogger:
         self.started = meta["started"]
         self.tags = meta["tags"]
         self.pid = int(meta.get("pid", -1))
+        self.status: str | None = meta.get("status")
+        self._vars: list[str] | None = meta.get("vars")
         self.root = Path("log/" + self.folder_name).resolve()
         self.var_root = self.root / "vars"
         self.weights_root = self.root / "weights"
         self.workspace = self.root / "workspace"
         self.stdout_file = self.root / "stdout.txt"
         self.stderr_file = self.root / "stderr.txt"
+        self.status_file = self.root / "status.json"
+
+        # liveness of the job process, see start_heartbeat
+        self._heartbeat: threading.Thread | None = None
+        self._stop_heartbeat = threading.Event()
+        # the heartbeat thread and the main thread both write status.json; reentrant for a
+        # SIGTERM handler that interrupts a write of the main thread
+        self._lock_status = threading.RLock()
+        self._last_step: int | None = None
+        self.startup_seconds: float | None = None
+
+        # asynchronous logging, see start_async_writer
+        self._queue: queue.Queue | None = None
+        self._writer: threading.Thread | None = None
+        self._on_full = "block"
+        self.n_dropped = 0
+
+        # number of entries per variable, counted on disk once when first logged to
+        self._n_entries: dict[str, int] = {}
+        self._var_folders: set[str] = set()
+        self._vector_widths: dict[str, int] = {}
+        # storage of each variable, see _get_storage
+        self._storages: dict[str, str | None] = {}
+
+        # images are encoded in a thread pool, see set_image_format
+        self._image_formats: dict[str, ImageFormat] = {}
+        self._image_pool: ThreadPoolExecutor | None = None
+        self._pending_images: list[Future] = []
 
     @staticmethod
     def from_log(folder_name: str) -> "RunLogger":
         tracker = RunLogger(folder_name)
         return tracker
 
+    @staticmethod
+    def list_runs() -> list["RunLogger"]:
+        """all runs in log/, loaded from the RunCatalog"""
+        return [RunLogger(meta["folder_name"], meta) for meta in RunCatalog().list_runs()]
+
     @staticmethod
     def create(submission: JobSubmission) -> "RunLogger":
         """creates folder structure for run"""
@@ -99,6 +247,7 @@ class RunLogger:
 
         with (root / "log.json").open("w") as F:
             json.dump(meta, F, indent=2)
+        RunCatalog().add(folder_name, meta, status="running")
 
         tracker = RunLogger(folder_name)
         return tracker
@@ -115,6 +264,7 @@ class RunLogger:
         data["name"] = value
         with (self.root / "log.json").open("w") as F:
             json.dump(data, F, indent=2)
+        RunCatalog(self.root.parent).update(self.folder_name, name=value)
 
     @property
     def display_name(self) -> str:
@@ -122,13 +272,58 @@ class RunLogger:
         return f"{in_progress} {self.name} ({self.started})"
 
     def is_in_progress(self) -> bool:
-        return self.pid in [p.pid for p in mp.active_children()]
-
-    def get_mp_process(self) -> BaseProcess:
-        for p in mp.active_children():
-            if p.pid == self.pid:
-                return p
-        raise Exception("Process not found")
+        """whether the job process is alive, answered from the heartbeat in status.json"""
+        if self.status in ["finished", "failed", "terminated"]:
+            return False
+        status = self.read_status()
+        if status is None:
+            # runs of older versions have no status file
+            return self.pid in [p.pid for p in mp.active_children()]
+        return status["state"] == "running" and (
+            time.time() - status["heartbeat"] < self.HEARTBEAT_TIMEOUT
+        )
+
+    def read_status(self) -> dict[str, Any] | None:
+        """contents of status.json: state, pid, started, last_step, exit_code, startup_seconds
+        and heartbeat (times as POSIX timestamps), or None if the run has no status file"""
+        try:
+            with self.status_file.open() as F:
+                return json.load(F)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def start_heartbeat(self) -> None:
+        """in the job process: periodically update the heartbeat in status.json"""
+        self._write_status("running")
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+
+    def set_startup_time(self, seconds: float) -> None:
+        """seconds from the launch of the job until its run method is called"""
+        self.startup_seconds = seconds
+        self._write_status("running")
+
+    def _beat(self) -> None:
+        while not self._stop_heartbeat.wait(self.HEARTBEAT_INTERVAL):
+            self._write_status("running")
+
+    def _write_status(self, state: str, exit_code: int | None = None) -> None:
+        status = {
+            "state": state,
+            "pid": os.getpid(),
+            "started": datetime.strptime(self.started, "%Y-%m-%d %H:%M:%S").timestamp(),
+            "last_step": self._last_step,
+            "exit_code": exit_code,
+            "startup_seconds": self.startup_seconds,
+            "heartbeat": time.time(),
+        }
+        # replace atomically, readers never see a partially written file. The temporary
+        # file is unique per write, a SIGTERM handler could interrupt a write in progress.
+        tmp_file = self.status_file.with_name(f".{self.status_file.name}.{uuid.uuid4().hex}")
+        with self._lock_status:
+            with tmp_file.open("w") as F:
+                json.dump(status, F)
+            tmp_file.replace(self.status_file)
 
     @property
     def config(self) -> Any:
@@ -137,13 +332,40 @@ class RunLogger:
         return meta
 
     def get_stderr(self) -> str:
-        return self.stderr_file.read_text()
+        return output_file.read_all(self.stderr_file)
 
     def get_stdout(self) -> str:
-        return self.stdout_file.read_text()
+        return output_file.read_all(self.stdout_file)
+
+    def tail_stdout(self, n_lines: int = 10) -> str:
+        return output_file.tail(self.stdout_file, n_lines)
+
+    def tail_stderr(self, n_lines: int = 10) -> str:
+        return output_file.tail(self.stderr_file, n_lines)
+
+    def read_stdout(self, offset: int = 0) -> tuple[str, int]:
+        """text written to stdout after byte offset and the offset to continue reading from"""
+        return output_file.read_chunk(self.stdout_file, offset)
+
+    def read_stderr(self, offset: int = 0) -> tuple[str, int]:
+        """text written to stderr after byte offset and the offset to continue reading from"""
+        return output_file.read_chunk(self.stderr_file, offset)
+
+    def set_status(self, status: str, exit_code: int | None = None) -> None:
+        """status of the run: running, finished, failed or terminated"""
+        self.status = status
+        if self._heartbeat is not None:
+            self._stop_heartbeat.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+        self._write_status(status, exit_code)
+        RunCatalog(self.root.parent).update(self.folder_name, status=status)
 
     def delete_log(self) -> None:
         shutil.rmtree(self.root)
+        RunCatalog(self.root.parent).remove(self.folder_name)
+        # the snapshot of the code of the run, if no other run uses it
+        remove_unused_snapshots()
 
     def set_tags(self, tags: list[str]) -> None:
         self.tags = tags
@@ -153,37 +375,371 @@ class RunLogger:
         data["tags"] = tags
         with (self.root / "log.json").open("w") as F:
             json.dump(data, F, indent=2)
+        RunCatalog(self.root.parent).update(self.folder_name, tags=tags)
 
     @property
     def vars(self) -> list[str]:
+        if self._vars is not None:
+            return self._vars
         var_names = [x.stem for x in self.var_root.iterdir()]
         return sorted(var_names)
 
-    def read_var(self, var: str) -> list[LogEntry]:
-        # this reads everything...
-        files = sorted(list((self.var_root / var).glob("*.pkl")))
-        data = [pickle.load(F.open("rb")) for F in files]
-        data = [LogEntry(**d) for d in data]
-        return data
+    def read_var(self, var: str, start: int = 0) -> list[LogEntry]:
+        """read entries of var. Skips the first start entries, so that passing the number of
+        entries read so far as cursor only returns entries logged since then."""
+        entries = self._read_packed(var, start)
+        # pickles: legacy runs, and the entries after a variable diverged from its packed
+        # format, so they always follow the packed entries
+        start = max(0, start - self._count_packed(var))
+        files = sorted((self.var_root / var).glob("*.pkl"), key=lambda f: int(f.stem))
+        entries.extend(LogEntry(**pickle.load(F.open("rb"))) for F in files[start:])
+        return entries
+
+    def _count_packed(self, var: str) -> int:
+        n_records = 0
+        for file_name, dtype in PACKED_FILES.values():
+            path = self.var_root / var / file_name
+            if path.exists():
+                n_records += path.stat().st_size // dtype.itemsize
+        return n_records
+
+    def _read_packed(self, var: str, start: int) -> list[LogEntry]:
+        entries: list[LogEntry] = []
+        try:
+            records = self.read_scalars(var, start=start)
+        except FileNotFoundError:
+            pass
+        else:
+            entries.extend(
+                LogEntry(
+                    t=datetime.fromtimestamp(t),
+                    index=int(index),
+                    data=np.float64(value),
+                    is_image=False,
+                )
+                for index, t, value in records.tolist()
+            )
+            return entries
+
+        try:
+            vector_records = self.read_vectors(var, start=start)
+        except FileNotFoundError:
+            pass
+        else:
+            rows = self.vector_data(var, start + len(vector_records))[start:]
+            entries.extend(
+                LogEntry(
+                    t=datetime.fromtimestamp(record["t"]),
+                    index=int(record["index"]),
+                    data=np.array(row),
+                    is_image=False,
+                )
+                for record, row in zip(vector_records, rows)
+            )
+            return entries
+
+        try:
+            image_records = self.read_images(var, start=start)
+        except FileNotFoundError:
+            return entries
+
+        for record in image_records:
+            thumbnail = self.thumbnail_path(var, record)
+            entries.append(
+                LogEntry(
+                    t=datetime.fromtimestamp(record["t"]),
+                    index=int(record["index"]),
+                    data=str(self.image_path(var, record)),
+                    is_image=True,
+                    thumbnail=None if thumbnail is None else str(thumbnail),
+                )
+            )
+        return entries
+
+    def read_scalars(self, var: str, start: int = 0) -> np.ndarray:
+        """read packed scalars of var as structured array with fields index, t and value.
+        Skips the first start records, to incrementally read only newly logged records.
+        Raises FileNotFoundError, if var has no packed scalars."""
+        return read_records(self.var_root / var / SCALAR_FILE, SCALAR_DTYPE, start=start)
+
+    def read_vectors(self, var: str, start: int = 0) -> np.ndarray:
+        """read the index of logged 1-D vectors of var, with fields index, t and width.
+        The vectors themselves are returned by vector_data. Raises FileNotFoundError,
+        if var has no packed vectors."""
+        return read_records(self.var_root / var / VECTOR_INDEX_FILE, VECTOR_DTYPE, start=start)
+
+    def vector_data(self, var: str, n_rows: int) -> np.ndarray:
+        """memory-map the first n_rows logged vectors of var as (steps x width) array,
+        so that slicing only reads the selected rows from disk"""
+        if n_rows == 0:
+            return np.zeros((0, 0))
+        first = read_records(self.var_root / var / VECTOR_INDEX_FILE, VECTOR_DTYPE, count=1)
+        width = int(first[0]["width"])
+        if width == 0:
+            # empty vectors.bin of runs that logged empty vectors before they were pickled
+            return np.zeros((n_rows, 0))
+        return np.memmap(
+            self.var_root / var / VECTOR_FILE, dtype="<f8", mode="r", shape=(n_rows, width)
+        )
+
+    def read_images(self, var: str, start: int = 0) -> np.ndarray:
+        """read the index of logged images of var, without loading any image. Use image_path
+        to get the file of a record. Raises FileNotFoundError, if var has no indexed images."""
+        return read_records(self.var_root / var / IMAGE_FILE, IMAGE_DTYPE, start=start)
+
+    def image_path(self, var: str, record: np.void) -> Path:
+        """path of the image file of a record from read_images"""
+        suffix = ImageFormat(IMAGE_FORMATS[record["format"]]).suffix
+        return self.var_root / var / f"{record['index']:06}{suffix}"
+
+    def thumbnail_path(self, var: str, record: np.void) -> Path | None:
+        """path of the thumbnail of a record from read_images, if one was saved"""
+        if not record["has_thumbnail"]:
+            return None
+        return self.image_path(var, record).with_suffix(
+            ".thumb" + ImageFormat(IMAGE_FORMATS[record["format"]]).suffix
+        )
 
     def log(self, name: str, var: np.ndarray, index: int | None = None) -> None:
         """log variable"""
+        t = datetime.now()
+        index = self._next_index(name, index)
+        self._last_step = index
+        if self._queue is None:
+            for _, _, error in self._write([(name, var, index, t)]):
+                raise error
+            return
+
+        # copy, because the caller might modify var in-place before it is written
+        item = (name, np.array(var, copy=True), index, t)
+        if self._on_full == "block":
+            self._queue.put(item)
+            return
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.n_dropped == 0:
+                print(f"WARNING: log queue is full, dropping entries of {name}", file=sys.stderr)
+            self.n_dropped += 1
+
+    def start_async_writer(self, max_queue_size: int = 10000, on_full: str = "block") -> None:
+        """Write logged variables in a background thread instead of the calling thread.
+        When the queue is full, log() either waits for the writer (on_full="block")
+        or discards the entry (on_full="drop"). Use flush() and close() to wait for
+        queued entries to be written."""
+        assert on_full in ["block", "drop"], f"Unknown policy for a full queue: {on_full}"
+        if self._queue is not None:
+            return
+        self._on_full = on_full
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._writer = threading.Thread(target=self._drain_queue, daemon=True)
+        self._writer.start()
+
+    def set_image_format(
+        self,
+        name: str,
+        format: str = "png",
+        quality: int = 90,
+        thumbnail_size: int | None = 256,
+    ) -> None:
+        """Choose the encoding of images logged as name: "png" (lossless), "jpeg" or "webp",
+        with quality in [0, 100] for lossy formats. Alongside each image, a thumbnail with
+        at most thumbnail_size pixels per edge is saved for faster previews."""
+        assert format in ["png", "jpeg", "webp"], f"Unsupported image format: {format}"
+        self._image_formats[name] = ImageFormat(format, quality, thumbnail_size)
+
+    def flush(self) -> None:
+        """block until all queued entries are written"""
+        if self._queue is not None:
+            self._queue.join()
+        self._wait_for_images()
+
+    def close(self) -> None:
+        """write all queued entries and stop the background writer"""
+        if self._queue is not None and self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._queue = None
+            self._writer = None
+
+        self._wait_for_images()
+        if self._image_pool is not None:
+            self._image_pool.shutdown()
+            self._image_pool = None
+
+    def _wait_for_images(self, max_pending: int = 0) -> None:
+        while len(self._pending_images) > max_pending:
+            future = self._pending_images.pop(0)
+            try:
+                future.result()
+            except Exception as e:
+                print(f"ERROR: failed to encode logged image: {e}", file=sys.stderr)
+
+    def _drain_queue(self) -> None:
+        assert self._queue is not None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                errors = self._write([item for item in batch if item is not None])
+            except Exception as e:
+                print(f"ERROR: failed to write logged variables: {e}", file=sys.stderr)
+            else:
+                for name, index, error in errors:
+                    print(f"ERROR: failed to write {name} at {index}: {error}", file=sys.stderr)
+
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _next_index(self, name: str, index: int | None) -> int:
+        if name not in self._n_entries:
+            self._n_entries[name] = self._count_entries(name)
+        next_index = self._n_entries[name]
+        self._n_entries[name] += 1
+        return next_index if index is None else index
+
+    def _count_entries(self, name: str) -> int:
         var_folder = self.var_root / name
-        var_folder.mkdir(exist_ok=True)
-
-        index = len(list(var_folder.iterdir())) if index is None else index
-
-        var_path = self.var_root / name / f"{index:06}.pkl"
-
-        var = np.nan_to_num(var, copy=True)
-
-        if len(var.shape) >= 2:
-            # save as jpg
-            img_path = self.var_root / name / f"{index:06}.png"
-            im = Image.fromarray(var)
-            im.save(img_path)
-            data = {"t": datetime.now(), "index": index, "data": str(img_path), "is_image": True}
-        else:
-            data = {"t": datetime.now(), "index": index, "data": var, "is_image": False}
+        if not var_folder.exists():
+            return 0
+        return self._count_packed(name) + len(list(var_folder.glob("*.pkl")))
+
+    def _get_storage(self, name: str) -> str | None:
+        """storage of the entries of a variable that were logged before, None for a new one"""
+        if name not in self._storages:
+            var_folder = self.var_root / name
+            storage = None
+            if any(var_folder.glob("*.pkl")):
+                storage = "objects"
+            else:
+                for packed, (file_name, _) in PACKED_FILES.items():
+                    if (var_folder / file_name).exists():
+                        storage = packed
+            self._storages[name] = storage
+        return self._storages[name]
+
+    def _var_folder(self, name: str) -> Path:
+        var_folder = self.var_root / name
+        if name not in self._var_folders:
+            if not var_folder.exists():
+                var_folder.mkdir()
+                RunCatalog(self.root.parent).add_var(self.folder_name, name)
+            self._var_folders.add(name)
+        return var_folder
+
+    def _write(
+        self, items: list[tuple[str, Any, int, datetime]]
+    ) -> list[tuple[str, int, Exception]]:
+        """Write the items and return the (name, index, error) of those that failed, so
+        that one bad entry does not drop the other entries of a batch."""
+        # collect records, to append them with one write per variable
+        scalars: dict[str, list[tuple[int, float, float]]] = {}
+        images: dict[str, list[tuple[int, float, int, int]]] = {}
+        errors: list[tuple[str, int, Exception]] = []
+
+        for name, var, index, t in items:
+            try:
+                var = np.nan_to_num(var, copy=True)
+                storage = storage_of(var)
+                previous = self._get_storage(name)
+                if (previous is not None and previous != storage) or (
+                    storage == "vectors" and len(var) != self._vector_width(name, len(var))
+                ):
+                    # once a variable diverges from its packed format, e.g. a vector of
+                    # another length, all later entries are pickled, after the packed ones
+                    storage = "objects"
+
+                if storage == "scalars":
+                    scalars.setdefault(name, []).append((index, t.timestamp(), float(var)))
+                elif storage == "images":
+                    record = self._write_image(name, var, index, t)
+                    images.setdefault(name, []).append(record)
+                elif storage == "vectors":
+                    self._write_vector(name, var, index, t)
+                else:
+                    # e.g. strings, also the previous format for everything
+                    self._write_object(name, var, index, t)
+                self._storages[name] = storage
+            except Exception as e:
+                errors.append((name, index, e))
+
+        packed: list[tuple[Mapping[str, Sequence[tuple[Any, ...]]], str, np.dtype]] = [
+            (scalars, SCALAR_FILE, SCALAR_DTYPE),
+            (images, IMAGE_FILE, IMAGE_DTYPE),
+        ]
+        for records, file_name, dtype in packed:
+            for name, entries in records.items():
+                try:
+                    with (self._var_folder(name) / file_name).open("ab") as F:
+                        F.write(np.array(entries, dtype=dtype).tobytes())
+                except Exception as e:
+                    errors.extend((name, index, e) for index, *_ in entries)
+        return errors
+
+    def _write_image(
+        self, name: str, var: np.ndarray, index: int, t: datetime
+    ) -> tuple[int, float, int, int]:
+        """starts encoding the image and returns its record for the image index"""
+        # raises for arrays that are no image, before a record of the image is written
+        im = Image.fromarray(var)
+        image_format = self._image_formats.get(name, ImageFormat())
+        has_thumbnail = int(image_format.thumbnail_size is not None)
+        record = (index, t.timestamp(), IMAGE_FORMATS.index(image_format.format), has_thumbnail)
+        # as returned by read_images, to get the paths
+        packed = np.array([record], dtype=IMAGE_DTYPE)[0]
+
+        self._var_folder(name)
+        self._submit_image(
+            im, self.image_path(name, packed), image_format, self.thumbnail_path(name, packed)
+        )
+        return record
+
+    def _vector_width(self, name: str, width: int) -> int:
+        """width of the packed vectors of a variable, width for a new one"""
+        if name not in self._vector_widths:
+            index_file = self.var_root / name / VECTOR_INDEX_FILE
+            if index_file.exists():
+                first = read_records(index_file, VECTOR_DTYPE, count=1)
+                if len(first) > 0:
+                    width = int(first[0]["width"])
+            self._vector_widths[name] = width
+        return self._vector_widths[name]
+
+    def _write_vector(self, name: str, var: np.ndarray, index: int, t: datetime) -> None:
+        var_folder = self._var_folder(name)
+        index_file = var_folder / VECTOR_INDEX_FILE
+        # append the row before its index record, so readers never see an incomplete row
+        with (var_folder / VECTOR_FILE).open("ab") as F:
+            F.write(var.astype("<f8").tobytes())
+        record = np.array([(index, t.timestamp(), len(var))], dtype=VECTOR_DTYPE)
+        with index_file.open("ab") as F:
+            F.write(record.tobytes())
+
+    def _write_object(self, name: str, var: np.ndarray, index: int, t: datetime) -> None:
+        var_path = self._var_folder(name) / f"{index:06}.pkl"
+        data = {"t": t, "index": index, "data": var, "is_image": False}
         with var_path.open("wb") as F:
             pickle.dump(data, F)
+
+    def _submit_image(
+        self,
+        im: Image.Image,
+        img_path: Path,
+        image_format: ImageFormat,
+        thumbnail_path: Path | None,
+    ) -> None:
+        if self._image_pool is None:
+            self._image_pool = ThreadPoolExecutor(self.IMAGE_WORKERS, "image_encoder")
+        # limit memory used by images waiting to be encoded
+        self._wait_for_images(max_pending=self.MAX_PENDING_IMAGES)
+        self._pending_images.append(
+            self._image_pool.submit(encode_image, im, img_path, image_format, thumbnail_path)
+        )
@@ -0,0 +1,110 @@
+"""Snapshots of the code of the workspace, in which jobs are run.
+
+A snapshot is a clone of the workspace repository at a commit with the uncommitted diff
+applied. Snapshots are cached in log/.snapshots/ by commit and hash of the diff, so that
+runs submitted with the same state of the code share one snapshot. The clones share the
+objects of the workspace repository (git clone --shared), instead of copying them.
+Snapshots that no run links to anymore are removed by remove_unused_snapshots.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+SNAPSHOT_DIR = Path("log/.snapshots")
+# snapshots used more recently are kept, a job might be about to link its workspace to it
+MIN_UNUSED_SECONDS = 3600.0
+
+
+def snapshot_key(commit: str, diff: str) -> str:
+    diff_hash = hashlib.sha256(diff.encode()).hexdigest()
+    return f"{commit[:16]}-{diff_hash[:16]}"
+
+
+def get_snapshot(commit: str, diff: str, repo: Path = Path(".")) -> Path:
+    """path to the snapshot of repo at commit with diff applied, created if necessary.
+    Safe to call from concurrent job processes."""
+    snapshot_dir = SNAPSHOT_DIR.resolve()
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    key = snapshot_key(commit, diff)
+    path = snapshot_dir / key
+    # written after the snapshot is complete, a snapshot without it is a leftover of a crash
+    ready = snapshot_dir / f"{key}.ready"
+    with (snapshot_dir / f"{key}.lock").open("w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        if ready.exists():
+            # the time of the last use, see remove_unused_snapshots
+            os.utime(ready)
+            return path
+
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if ready.exists():
+            os.utime(ready)
+            return path  # created by another job in the meantime
+        if path.exists():
+            shutil.rmtree(path)
+        create_snapshot(repo.resolve(), path, commit, diff)
+        ready.touch()
+    return path
+
+
+def create_snapshot(repo: Path, path: Path, commit: str, diff: str) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(["git", *args], cwd=path, capture_output=True).check_returncode()
+
+    subprocess.run(
+        ["git", "clone", "--shared", "--no-checkout", str(repo), str(path)], capture_output=True
+    ).check_returncode()
+
+    lfs_storage = repo / ".git" / "lfs"
+    if lfs_storage.exists():
+        # use the LFS objects of the workspace, instead of downloading them again
+        git("config", "lfs.storage", str(lfs_storage))
+
+    git("checkout", "--detach", commit)
+
+    if len(diff) > 0:
+        diff_file = path.with_name(path.name + ".diff")
+        diff_file.write_text(diff)
+        try:
+            git("apply", str(diff_file))
+        finally:
+            os.remove(diff_file)
+
+
+def remove_unused_snapshots(
+    log_dir: Path = Path("log"), min_unused_seconds: float = MIN_UNUSED_SECONDS
+) -> list[Path]:
+    """Delete snapshots that no run workspace in log_dir links to and that were not used
+    for min_unused_seconds. Returns the deleted snapshots."""
+    snapshot_dir = (log_dir / SNAPSHOT_DIR.name).resolve()
+    if not snapshot_dir.exists():
+        return []
+    used = {
+        workspace.resolve()
+        for workspace in log_dir.glob("*/workspace")
+        if workspace.is_symlink()
+    }
+
+    removed = []
+    for path in snapshot_dir.iterdir():
+        if not path.is_dir() or path in used:
+            continue
+        ready = snapshot_dir / f"{path.name}.ready"
+        with (snapshot_dir / f"{path.name}.lock").open("w") as lock_file:
+            try:
+                # not while a job creates or looks up the snapshot
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue
+            last_used = ready.stat().st_mtime if ready.exists() else path.stat().st_mtime
+            if time.time() - last_used < min_unused_seconds:
+                continue
+            ready.unlink(missing_ok=True)
+            shutil.rmtree(path)
+        removed.append(path)
+    return removed
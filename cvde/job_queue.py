@@ -0,0 +1,138 @@
+import fcntl
+import json
+import pickle
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Iterator
+
+from cvde.job import JobSubmission
+from cvde.resources import Allocation
+
+
+@dataclass
+class QueueEntry:
+    submission: JobSubmission
+    wait_for: list[str]  # ids of submissions
+    state: str  # pending or running
+    pid: int | None = None
+    launched: float | None = None  # POSIX timestamp
+    allocation: Allocation | None = None
+
+
+class JobQueue:
+    """Journal of the submissions of the Scheduler, so that queued and running jobs
+    survive a restart of the scheduler. Submissions are removed when their job finished."""
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS submissions (
+            id TEXT PRIMARY KEY,
+            run_name TEXT NOT NULL,
+            job_name TEXT NOT NULL,
+            state TEXT NOT NULL,
+            pid INTEGER,
+            launched REAL,
+            allocation TEXT,
+            submission BLOB NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS edges (
+            from_id TEXT NOT NULL,
+            to_id TEXT NOT NULL,
+            PRIMARY KEY (from_id, to_id)
+        )""",
+    ]
+
+    def __init__(self, log_dir: Path = Path("log")) -> None:
+        self.log_dir = log_dir
+        self.path = log_dir / "queue.sqlite"
+        self._lock_file: IO | None = None
+
+    def lock(self) -> bool:
+        """Lock the queue for this process, until it exits. Returns False if another scheduler
+        holds the lock, two schedulers would launch the same submissions."""
+        if self._lock_file is not None:
+            return True
+        self.log_dir.mkdir(exist_ok=True)
+        lock_file = (self.log_dir / "queue.lock").open("w")
+        try:
+            # unlike flock, POSIX locks are not inherited by the forked job processes
+            fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.log_dir.mkdir(exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, submission: JobSubmission, wait_for: list[JobSubmission]) -> None:
+        self.add_many([submission], wait_for)
+
+    def add_many(self, submissions: list[JobSubmission], wait_for: list[JobSubmission]) -> None:
+        """add submissions that each wait for wait_for, in one transaction"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO submissions VALUES (?, ?, ?, 'pending', NULL, NULL, NULL, ?)",
+                [
+                    (
+                        submission.id,
+                        submission.run_name,
+                        submission.job_name,
+                        pickle.dumps(submission),
+                    )
+                    for submission in submissions
+                ],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO edges VALUES (?, ?)",
+                [(submission.id, other.id) for submission in submissions for other in wait_for],
+            )
+
+    def set_running(self, id: str, pid: int, launched: float, allocation: Allocation) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE submissions SET state = 'running', pid = ?, launched = ?, allocation = ? "
+                "WHERE id = ?",
+                (pid, launched, json.dumps(asdict(allocation)), id),
+            )
+
+    def remove(self, id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM submissions WHERE id = ?", (id,))
+            conn.execute("DELETE FROM edges WHERE from_id = ? OR to_id = ?", (id, id))
+
+    def load(self) -> list[QueueEntry]:
+        """all entries in the order of submission"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, state, pid, launched, allocation, submission FROM submissions "
+                "ORDER BY rowid"
+            ).fetchall()
+            wait_for: dict[str, list[str]] = {}
+            for from_id, to_id in conn.execute("SELECT from_id, to_id FROM edges"):
+                wait_for.setdefault(from_id, []).append(to_id)
+
+        entries = []
+        for id, state, pid, launched, allocation, submission in rows:
+            entries.append(
+                QueueEntry(
+                    submission=pickle.loads(submission),
+                    wait_for=wait_for.get(id, []),
+                    state=state,
+                    pid=pid,
+                    launched=launched,
+                    allocation=None if allocation is None else Allocation(**json.loads(allocation)),
+                )
+            )
+        return entries
@@ -1,5 +1,6 @@
 import sys
 import os
+import threading
 
 import streamlit as st
 from pathlib import Path
@@ -8,11 +9,35 @@ import cvde
 import requests
 
 from cvde.scheduler import Scheduler
+from cvde.scheduler_server import SchedulerClient
 
 
 @st.cache_resource
-def get_scheduler() -> Scheduler:
-    return Scheduler()
+def get_scheduler() -> Scheduler | SchedulerClient:
+    """the scheduler of `cvde scheduler`, if it is running, otherwise a scheduler in the GUI"""
+    client = SchedulerClient.connect()
+    if client is None:
+        scheduler = Scheduler()
+        scheduler.on_change.append(cvde.gui.update_gui_from_thread)
+        return scheduler
+
+    threading.Thread(target=forward_changes, args=(client,), daemon=True).start()
+    return client
+
+
+def forward_changes(client: SchedulerClient) -> None:
+    """update the GUI, when the queue of the scheduler changes"""
+    version = 0
+    while True:
+        try:
+            new_version = client.wait_change(version)
+        except (OSError, EOFError):
+            # the scheduler was stopped, the GUI replaces the client on its next run
+            cvde.gui.update_gui_from_thread()
+            return
+        if new_version != version:
+            version = new_version
+            cvde.gui.update_gui_from_thread()
 
 
 class GUI:
@@ -20,16 +45,18 @@ class GUI:
         sys.path.append(os.getcwd())
 
         # create persistent job scheduler
-        st.session_state["scheduler"] = get_scheduler()
+        scheduler = get_scheduler()
+        if isinstance(scheduler, SchedulerClient) and not scheduler.is_running():
+            # `cvde scheduler` was stopped, schedule in the GUI or in a restarted scheduler
+            get_scheduler.clear()
+            scheduler = get_scheduler()
+        st.session_state["scheduler"] = scheduler
 
         # initialize tags
         if "tags" not in st.session_state:
             st.session_state.tags = set()
             Path("log").mkdir(exist_ok=True, parents=False)
-            runs = os.listdir("log")
-            all_logs = [cvde.job.RunLogger.from_log(run) for run in runs]
-            all_logs.sort(key=lambda t: t.started, reverse=True)
-            for log in all_logs:
+            for log in cvde.job.RunLogger.list_runs():
                 st.session_state.tags.update({t for t in log.tags})
 
         if "selected_page" not in st.session_state:
@@ -66,11 +93,31 @@ class GUI:
                     pages[last_page_name].on_leave()
                 st.session_state["selected_page"] = page_name
 
+        self.show_errors(scheduler)
+
         active_page_name = st.session_state["selected_page"]
 
         self.title(active_page_name)
         pages[active_page_name].run()
 
+    def show_errors(self, scheduler: Scheduler | SchedulerClient) -> None:
+        """errors of submissions, that happened after submitting, e.g. in the capture of the
+        code or in a background submission to `cvde scheduler`"""
+        if "n_scheduler_errors" not in st.session_state:
+            st.session_state.n_scheduler_errors = 0
+        try:
+            errors, n_errors = scheduler.get_errors(st.session_state.n_scheduler_errors)
+        except (OSError, EOFError):
+            errors, n_errors = [], st.session_state.n_scheduler_errors
+        st.session_state.n_scheduler_errors = n_errors
+        # the list is shared with the threads of the launcher, so it is emptied in place;
+        # pop is atomic, an error appended meanwhile is shown on the next run
+        submit_errors = st.session_state.get("submit_errors", [])
+        while len(submit_errors) > 0:
+            errors.append(submit_errors.pop(0))
+        for error in errors:
+            st.error(error)
+
     def title(self, t: str) -> None:
         if "weather" not in st.session_state:
             st.session_state["weather"] = ""
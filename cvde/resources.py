@@ -0,0 +1,168 @@
+import os
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import psutil
+import yaml
+
+
+@dataclass
+class ResourceRequest:
+    """resources a job needs. gpus is either a number of GPUs or a list of specific GPU ids.
+    Jobs with an empty request are launched without waiting for resources."""
+
+    gpus: int | list[int] = 0
+    cpus: int = 0
+    memory_gb: float = 0.0
+
+    @property
+    def n_gpus(self) -> int:
+        return len(self.gpus) if isinstance(self.gpus, list) else self.gpus
+
+    def uses(self, resources: set[str]) -> bool:
+        """whether any of the resources ("gpus", "cpus", "memory_gb") is requested"""
+        amounts = {"gpus": self.n_gpus, "cpus": self.cpus, "memory_gb": self.memory_gb}
+        return any(amounts[resource] > 0 for resource in resources)
+
+
+@dataclass
+class Allocation:
+    gpu_ids: list[int] = field(default_factory=list)
+    cpu_ids: list[int] = field(default_factory=list)
+    memory_gb: float = 0.0
+
+
+@dataclass
+class Inventory:
+    """resources of the machine that are available to jobs"""
+
+    gpu_ids: list[int]
+    cpu_ids: list[int]
+    memory_gb: float
+
+    @staticmethod
+    def detect(config_path: Path = Path("resources.yml")) -> "Inventory":
+        """Detect GPUs (nvidia-smi), CPU cores and memory. Each can be overridden in
+        resources.yml of the workspace, e.g. to keep cores for the GUI:
+
+            gpus: [0, 1]
+            cpus: 12  # or a list of core ids
+            memory_gb: 64
+        """
+        config: dict[str, Any] = {}
+        if config_path.exists():
+            with config_path.open() as F:
+                config = yaml.safe_load(F) or {}
+
+        if "gpus" in config:
+            gpu_ids = list(config["gpus"])
+        else:
+            gpu_ids = detect_gpus()
+
+        if hasattr(os, "sched_getaffinity"):
+            available_cpus = sorted(os.sched_getaffinity(0))
+        else:
+            available_cpus = list(range(os.cpu_count() or 1))
+        cpus = config.get("cpus", available_cpus)
+        cpu_ids = available_cpus[:cpus] if isinstance(cpus, int) else list(cpus)
+
+        memory_gb = config.get("memory_gb", psutil.virtual_memory().total / (1 << 30))
+        return Inventory(gpu_ids, cpu_ids, float(memory_gb))
+
+
+def detect_gpus() -> list[int]:
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    # cvde hides the GPUs from its own main process with -1, see cvde/__init__.py
+    if visible is not None and visible.strip() != "-1":
+        return [int(i) for i in visible.split(",") if i.strip().isdigit()]
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"],
+            capture_output=True,
+        )
+    except FileNotFoundError:
+        return []
+    if result.returncode != 0:
+        return []
+    return [int(line) for line in result.stdout.decode().split()]
+
+
+class ResourcePool:
+    """free resources of an inventory. Not thread safe, the scheduler holds a lock."""
+
+    def __init__(self, inventory: Inventory) -> None:
+        self.inventory = inventory
+        self.free_gpus = list(inventory.gpu_ids)
+        self.free_cpus = list(inventory.cpu_ids)
+        self.free_memory_gb = inventory.memory_gb
+
+    def can_ever_fit(self, request: ResourceRequest) -> bool:
+        """whether request fits into the empty machine"""
+        if isinstance(request.gpus, list):
+            gpus_fit = set(request.gpus).issubset(self.inventory.gpu_ids)
+        else:
+            gpus_fit = request.gpus <= len(self.inventory.gpu_ids)
+        return (
+            gpus_fit
+            and request.cpus <= len(self.inventory.cpu_ids)
+            and request.memory_gb <= self.inventory.memory_gb
+        )
+
+    def shortage(self, request: ResourceRequest) -> set[str]:
+        """the resources ("gpus", "cpus", "memory_gb") of request that are not free"""
+        short = set()
+        if isinstance(request.gpus, list):
+            if not set(request.gpus).issubset(self.free_gpus):
+                short.add("gpus")
+        elif request.gpus > len(self.free_gpus):
+            short.add("gpus")
+        if request.cpus > len(self.free_cpus):
+            short.add("cpus")
+        if request.memory_gb > self.free_memory_gb:
+            short.add("memory_gb")
+        return short
+
+    def allocate(self, request: ResourceRequest) -> Allocation | None:
+        """take the requested resources, or return None if they are not free"""
+        if isinstance(request.gpus, list):
+            if not set(request.gpus).issubset(self.free_gpus):
+                return None
+            gpu_ids = list(request.gpus)
+        else:
+            if request.gpus > len(self.free_gpus):
+                return None
+            gpu_ids = self.free_gpus[: request.gpus]
+
+        if request.cpus > len(self.free_cpus) or request.memory_gb > self.free_memory_gb:
+            return None
+        cpu_ids = self.free_cpus[: request.cpus]
+
+        self.free_gpus = [i for i in self.free_gpus if i not in gpu_ids]
+        self.free_cpus = self.free_cpus[request.cpus :]
+        self.free_memory_gb -= request.memory_gb
+        return Allocation(gpu_ids, cpu_ids, request.memory_gb)
+
+    def take(self, allocation: Allocation) -> None:
+        """mark the resources of an existing allocation as used, e.g. of a recovered job"""
+        self.free_gpus = [i for i in self.free_gpus if i not in allocation.gpu_ids]
+        self.free_cpus = [i for i in self.free_cpus if i not in allocation.cpu_ids]
+        self.free_memory_gb -= allocation.memory_gb
+
+    def release(self, allocation: Allocation) -> None:
+        self.free_gpus = sorted(self.free_gpus + allocation.gpu_ids)
+        self.free_cpus = sorted(self.free_cpus + allocation.cpu_ids)
+        self.free_memory_gb += allocation.memory_gb
+
+
+def apply_allocation(allocation: Allocation) -> None:
+    """in the job process: restrict it to the allocated GPUs and cores"""
+    if len(allocation.gpu_ids) > 0:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ",".join(str(i) for i in allocation.gpu_ids)
+    if len(allocation.cpu_ids) > 0 and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, allocation.cpu_ids)
+    if len(allocation.cpu_ids) > 0:
+        # thread pools of numpy, TensorFlow etc. are sized by these
+        for var in ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]:
+            os.environ.setdefault(var, str(len(allocation.cpu_ids)))
@@ -1,40 +1,88 @@
+import collections
+import io
 import threading
 import graphviz
 import sys
 import os
-import subprocess
 import multiprocessing as mp
+import multiprocessing.connection
+from multiprocessing.process import BaseProcess
 import typing
 from typing import Any
 import signal
+import subprocess
+import time
+import traceback
+
+import numpy as np
+import psutil
 
 import cvde
+from cvde.early_stopping import EarlyStopping, SuccessiveHalving
 from cvde.job import JobSubmission
+from cvde.job.fd_capture import FdCapture
+from cvde.job.snapshot import get_snapshot
+from cvde.job_queue import JobQueue
+from cvde.resources import Allocation, Inventory, ResourcePool, apply_allocation
+from cvde.sweep import sweep_id_tag
+from cvde.worker_pool import WorkerPool
 
 T = typing.TypeVar("T")
 
 
 class DAG(typing.Generic[T]):
+    """Nodes that wait for other nodes. An edge from_node -> to_node means from_node waits
+    for to_node. Nodes without pending edges are ready; they are kept in a set, which is
+    updated when nodes are added or popped, so that get_leaves does not scan the graph."""
+
     def __init__(self) -> None:
         self._lock = threading.Lock()
-        self._edges: dict[T, list[T]] = {}
-        self._nodes: list[T] = []
+        # dicts as insertion ordered sets, so that nodes are ready in the order of adding
+        self._edges: dict[T, dict[T, None]] = {}
+        self._reverse_edges: dict[T, dict[T, None]] = {}
+        self._ready: dict[T, None] = {}
 
-    def add_node(self, node: T, to_nodes: list[T] = []) -> None:
+    def add_node(self, node: T, to_nodes: list[T] | None = None) -> None:
         with self._lock:
-            self._nodes.append(node)
-            self._edges[node] = to_nodes
+            assert node not in self._edges, f"{node} was already added"
+            self._edges[node] = {}
+            self._reverse_edges[node] = {}
+            self._ready[node] = None
+            for to_node in to_nodes or []:
+                self._add_edge(node, to_node)
 
     def add_edge(self, from_node: T, to_node: T) -> None:
-        if from_node == to_node:
-            return
-
         with self._lock:
-            self._edges[from_node].append(to_node)
+            self._add_edge(from_node, to_node)
 
     def add_edges(self, from_node: T, to_nodes: list[T]) -> None:
         with self._lock:
-            self._edges[from_node].extend([n for n in to_nodes if n != from_node])
+            for to_node in to_nodes:
+                self._add_edge(from_node, to_node)
+
+    def _add_edge(self, from_node: T, to_node: T) -> None:
+        if from_node == to_node or to_node not in self._edges:
+            return  # nodes that are not in the graph (anymore) have nothing to wait for
+        if self._reaches(to_node, from_node):
+            raise ValueError(f"{from_node} can not wait for {to_node}, this would be a cycle")
+
+        self._edges[from_node][to_node] = None
+        self._reverse_edges[to_node][from_node] = None
+        self._ready.pop(from_node, None)
+
+    def _reaches(self, start: T, target: T) -> bool:
+        """whether start waits for target, directly or indirectly"""
+        visited = {start}
+        stack = [start]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node == target:
+                return True
+            for to_node in self._edges[node]:
+                if to_node not in visited:
+                    visited.add(to_node)
+                    stack.append(to_node)
+        return False
 
     def get_digraph(
         self, format: typing.Callable[[T], str] = lambda x: str(x), node_colors: dict[T, str] = {}
@@ -44,7 +92,7 @@ class DAG(typing.Generic[T]):
         graph.attr("graph", rankdir="LR", bgcolor="transparent", splines="ortho")
 
         with self._lock:
-            for node in self._nodes:
+            for node in self._edges:
                 graph.node(
                     format(node),
                     shape="box",
@@ -60,102 +108,455 @@ class DAG(typing.Generic[T]):
 
     def pop(self, node: T) -> None:
         with self._lock:
-            self._nodes.remove(node)
-            self._edges.pop(node)
-            for edges in self._edges.values():
-                if node in edges:
-                    edges.remove(node)
+            self._ready.pop(node, None)
+            for to_node in self._edges.pop(node):
+                self._reverse_edges[to_node].pop(node)
+            for from_node in self._reverse_edges.pop(node):
+                self._edges[from_node].pop(node)
+                if len(self._edges[from_node]) == 0:
+                    self._ready[from_node] = None
+
+    def __contains__(self, node: T) -> bool:
+        with self._lock:
+            return node in self._edges
+
+    def get_edges(self, node: T) -> list[T]:
+        """nodes that node waits for"""
+        with self._lock:
+            return list(self._edges[node])
 
     def get_all_nodes(self) -> list[T]:
         with self._lock:
-            return self._nodes.copy()
+            return list(self._edges)
 
     def get_leaves(self) -> list[T]:
         with self._lock:
-            leaves = [node for node, edges in self._edges.items() if len(edges) == 0]
-        return leaves
+            return list(self._ready)
 
 
 class Scheduler:
     """schedule jobs"""
 
-    def __init__(self) -> None:
-        self._current: dict[mp.Process, JobSubmission] = {}
+    # seconds between liveness checks of recovered jobs, which are not child processes
+    POLL_INTERVAL = 2.0
+    # number of kept errors of submissions, see get_errors
+    MAX_ERRORS = 100
+
+    def __init__(
+        self,
+        inventory: Inventory | None = None,
+        job_queue: JobQueue | None = None,
+        warm_workers: int = 0,
+    ) -> None:
+        """warm_workers: number of pre-started worker processes, that launch jobs without the
+        startup time of a new process"""
+        # running submissions by pid of their process
+        self._current: dict[int, JobSubmission] = {}
         self._lock_current = threading.Lock()
+        # submissions in _current, for O(1) lookup
+        self._launched: set[JobSubmission] = set()
+        # submissions whose code is still being captured, they are not launched yet
+        self._capturing: set[JobSubmission] = set()
         self._executiongraph: DAG[JobSubmission] = DAG()
+        # submissions are only launched if their requested resources are free
+        self._resources = ResourcePool(inventory or Inventory.detect())
+        self._allocations: dict[int, Allocation] = {}
+        self._lock_launch = threading.Lock()
+        # submissions are journaled, to recover them after a restart
+        self._queue = job_queue or JobQueue()
+        if not self._queue.lock():
+            raise RuntimeError("Another scheduler is already running in this workspace.")
+        # e.g. failed captures of the code, see get_errors
+        self._errors: list[str] = []
+        self._n_errors = 0
+        # called after submissions were added, launched, finished or cancelled
+        self.on_change: list[typing.Callable[[], None]] = []
+
+        # a single thread waits for all running jobs, see _monitor
+        self._processes: dict[int, BaseProcess] = {}
+        self._recovered_pids: dict[int, float] = {}  # pid -> launch time
+        self._wakeup_reader, self._wakeup_writer = mp.Pipe(duplex=False)
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+        self._workers = WorkerPool(warm_workers) if warm_workers > 0 else None
+
+        # early stopping of sweeps, by sweep id, see _check_early_stopping
+        self._halving: dict[str, SuccessiveHalving] = {}
+        self._trial_runs: dict[int, cvde.job.RunLogger] = {}  # pid -> run of a trial
+        self._last_metric_check = 0.0
+
+        self.recover()
 
     @property
-    def current(self) -> dict[mp.Process, JobSubmission]:
+    def current(self) -> dict[int, JobSubmission]:
         with self._lock_current:
             return self._current
 
-    def submit(self, sub: JobSubmission, wait_for: list[JobSubmission] = []) -> None:
-        self._executiongraph.add_node(sub, wait_for)
+    def submit(self, sub: JobSubmission, wait_for: list[JobSubmission] | None = None) -> None:
+        """Returns without waiting for the capture of the code of sub. The submission is
+        scheduled right away, and journaled and launched once its code is captured."""
+        self.submit_many([sub], wait_for)
+
+    def submit_many(
+        self, subs: list[JobSubmission], wait_for: list[JobSubmission] | None = None
+    ) -> None:
+        """Submit e.g. the runs of a sweep at once: they are journaled in one transaction
+        and launched once the code of all of them is captured. Each waits for wait_for."""
+        for sub in subs:
+            if not self._resources.can_ever_fit(sub.resources):
+                raise ValueError(
+                    f"{sub.run_name} requests more resources than available: "
+                    f"{self._resources.inventory}"
+                )
+        with self._lock_launch:
+            self._capturing.update(subs)
+        for sub in subs:
+            self._executiongraph.add_node(sub, wait_for)
+        self._notify()
+
+        remaining = len(subs)
+        lock_remaining = threading.Lock()
+
+        def on_captured() -> None:
+            nonlocal remaining
+            with lock_remaining:
+                remaining -= 1
+                if remaining > 0:
+                    return
+            self._captured(subs, wait_for or [])
+
+        for sub in subs:
+            sub.on_captured(on_captured)
+
+    def _captured(self, subs: list[JobSubmission], wait_for: list[JobSubmission]) -> None:
+        """called from the capture thread, exceptions would be lost there"""
+        captured = []
+        for sub in subs:
+            try:
+                sub.wait_for_capture()
+            except Exception as e:
+                if isinstance(e, subprocess.CalledProcessError):
+                    details = (e.stderr or b"").decode(errors="replace")
+                else:
+                    details = f"{type(e).__name__}: {e}"
+                self._error(f"Could not capture the code of {sub.run_name}: {details}")
+                if sub in self._executiongraph:
+                    self._executiongraph.pop(sub)
+            else:
+                captured.append(sub)
+
+        # submissions that were cancelled in the meantime are not journaled
+        captured = [sub for sub in captured if sub in self._executiongraph]
+        try:
+            self._queue.add_many(captured, wait_for)
+        except Exception as e:
+            names = ", ".join(sub.run_name for sub in captured)
+            self._error(f"Could not add {names} to the job queue: {type(e).__name__}: {e}")
+            for sub in captured:
+                if sub in self._executiongraph:
+                    self._executiongraph.pop(sub)
+        finally:
+            with self._lock_launch:
+                self._capturing.difference_update(subs)
         self.launch_ready_submissions()
+        self._notify()
+
+    def _error(self, message: str) -> None:
+        """report an error of a submission, that is not raised to the submitter"""
+        print(message, file=sys.stderr)
+        with self._lock_launch:
+            self._errors.append(message)
+            del self._errors[: -self.MAX_ERRORS]
+            self._n_errors += 1
+
+    def get_errors(self, since: int = 0) -> tuple[list[str], int]:
+        """Errors of submissions after the first since errors, and the number of errors so
+        far to pass as since next time. Only the last MAX_ERRORS errors are kept."""
+        with self._lock_launch:
+            n_new = min(self._n_errors - since, len(self._errors))
+            return self._errors[len(self._errors) - max(n_new, 0) :], self._n_errors
 
     def cancel(self, sub: JobSubmission) -> None:
         """Cancel a job submission before it launches."""
-        assert sub not in self._current.values(), "Can not cancel running job."
+        assert sub not in self._launched, "Can not cancel running job."
         self._executiongraph.pop(sub)
+        self._queue.remove(sub.id)
+        self._notify()
+
+    def recover(self) -> None:
+        """Restore the journaled submissions of a previous scheduler. Pending submissions are
+        queued again, running jobs are watched again if their process is still alive."""
+        recovered: dict[str, JobSubmission] = {}
+        for entry in self._queue.load():
+            sub = entry.submission
+            if entry.state == "running":
+                assert entry.pid is not None and entry.launched is not None
+                assert entry.allocation is not None
+                if not is_alive(entry.pid, entry.launched):
+                    print(f"{sub.run_name} stopped while the scheduler was not running.")
+                    self._queue.remove(sub.id)
+                    continue
+
+            wait_for = [recovered[id] for id in entry.wait_for if id in recovered]
+            self._executiongraph.add_node(sub, wait_for)
+            recovered[sub.id] = sub
+
+            if entry.state == "running":
+                launched = entry.launched
+                assert entry.pid is not None and entry.allocation is not None
+                assert launched is not None
+                print(f"Reattached to {sub.run_name}")
+                with self._lock_launch:
+                    self._resources.take(entry.allocation)
+                    self._track(entry.pid, sub, entry.allocation)
+                    self._recovered_pids[entry.pid] = launched
+
+        # launching wakes the monitor, which then also polls the recovered jobs
+        self.launch_ready_submissions()
 
     def get_scheduled_submissions(self) -> list[JobSubmission]:
         return self._executiongraph.get_all_nodes()
 
+    def get_queue(self) -> list[dict[str, Any]]:
+        """scheduled submissions with their state and the run names they wait for"""
+        launched = set(self.current.values())
+        return [
+            {
+                "id": sub.id,
+                "run_name": sub.run_name,
+                "job_name": sub.job_name,
+                "state": "running" if sub in launched else "pending",
+                "wait_for": [other.run_name for other in self._executiongraph.get_edges(sub)],
+            }
+            for sub in self._executiongraph.get_all_nodes()
+        ]
+
     def get_digraph(self) -> graphviz.Digraph:
         colors = {submission: "red" for submission in self.current.values()}
         return self._executiongraph.get_digraph(
             format=lambda x: f"{x.run_name} ({x.job_name})", node_colors=colors
         )
 
-    def watchdog(self, process: mp.Process) -> None:
-        process.join()
-        submission = self.current.pop(process)
-        self._executiongraph.pop(submission)
+    def _monitor(self) -> None:
+        """Wait for the processes of all running jobs at once. Jobs that finished at the
+        same time are handled as one batch, with one launch and one change notification."""
+        while True:
+            try:
+                self._monitor_once()
+            except Exception:
+                # without the monitor, no job would finish or launch anymore
+                print("ERROR in the job monitor of the scheduler:", file=sys.stderr)
+                traceback.print_exc()
+                time.sleep(self.POLL_INTERVAL)
+
+    def _monitor_once(self) -> None:
+        with self._lock_launch:
+            sentinels = {p.sentinel: pid for pid, p in self._processes.items()}
+            has_trials = any(sub.early_stopping is not None for sub in self._current.values())
+            poll = len(self._recovered_pids) > 0 or has_trials
+            timeout = self.POLL_INTERVAL if poll else None
+
+        ready = mp.connection.wait([self._wakeup_reader, *sentinels], timeout)
+        while self._wakeup_reader.poll():
+            self._wakeup_reader.recv()  # only interrupts the wait, to add new sentinels
+
+        if has_trials and time.time() - self._last_metric_check >= self.POLL_INTERVAL:
+            self._last_metric_check = time.time()
+            self._check_early_stopping()
+
+        finished = [sentinels[s] for s in ready if s in sentinels]
+        with self._lock_launch:
+            finished += [
+                pid
+                for pid, launched in self._recovered_pids.items()
+                if not is_alive(pid, launched)
+            ]
+        if len(finished) == 0:
+            return
+
+        for pid in finished:
+            try:
+                self._finish(pid)
+            except Exception:
+                # e.g. the job queue is locked, the other jobs are still handled
+                print(f"ERROR while handling the end of job {pid}:", file=sys.stderr)
+                traceback.print_exc()
         self.launch_ready_submissions()
-        cvde.gui.update_gui_from_thread()
+        self._notify()
+
+    def _check_early_stopping(self) -> None:
+        """Read the metric newly logged by running trials of sweeps with early stopping, and
+        terminate those that are worse than the rest of their sweep at a milestone. The
+        monitor frees their resources and launches pending trials, once they exited."""
+        with self._lock_launch:
+            trials = [
+                (pid, sub) for pid, sub in self._current.items() if sub.early_stopping is not None
+            ]
+        for pid, sub in trials:
+            try:
+                self._check_trial(pid, sub)
+            except Exception:
+                # e.g. a corrupt log of the run, it must not stop the monitor
+                print(f"ERROR while checking {sub.run_name} for early stopping:", file=sys.stderr)
+                traceback.print_exc()
+
+    def _check_trial(self, pid: int, sub: JobSubmission) -> None:
+        assert sub.sweep is not None and sub.early_stopping is not None
+        run = self._find_trial_run(pid, sub)
+        if run is None:
+            return  # the job process did not create its run yet
+        halving = self._get_halving(sub.sweep, sub.early_stopping)
+        entries = read_metric(run, halving.spec.metric, halving.n_read(sub.id))
+        stop = halving.update(sub.id, entries)
+        if stop is None:
+            return
 
-    def launch_ready_submissions(self) -> None:
-        def not_yet_launched(submission: JobSubmission) -> bool:
-            return submission not in self.current.values()
-
-        ready_submissions = filter(not_yet_launched, self._executiongraph.get_leaves())
-        for submission in ready_submissions:
-            print(f"Launched {submission.run_name}")
-            process = mp.Process(
-                target=_run,
-                args=(submission,),
-            )
+        milestone, value = stop
+        print(
+            f"Stopped {sub.run_name} early: {sub.early_stopping.metric} = {value:.4g} at "
+            f"step {milestone} is not in the best 1/{sub.early_stopping.reduction_factor} "
+            f"of sweep {sub.sweep}."
+        )
+        try:
+            # the job handles SIGTERM with Job.on_terminate
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _find_trial_run(self, pid: int, sub: JobSubmission) -> "cvde.job.RunLogger | None":
+        if pid not in self._trial_runs:
+            for run in cvde.job.RunLogger.list_runs():
+                if run.pid == pid and run.name == sub.run_name:
+                    self._trial_runs[pid] = run
+                    break
+        return self._trial_runs.get(pid)
+
+    def _get_halving(self, sweep: str, spec: EarlyStopping) -> SuccessiveHalving:
+        if sweep not in self._halving:
+            halving = SuccessiveHalving(spec)
+            # after a restart: the values of trials that already ended, running trials are
+            # read again from the start by _check_early_stopping
+            for run in cvde.job.RunLogger.list_runs():
+                if sweep_id_tag(sweep) in run.tags and not run.is_in_progress():
+                    halving.update(run.folder_name, read_metric(run, spec.metric, 0))
+            self._halving[sweep] = halving
+        return self._halving[sweep]
+
+    def _finish(self, pid: int) -> None:
+        with self._lock_launch:
+            process = self._processes.pop(pid, None)
+            self._recovered_pids.pop(pid, None)
+            submission = self.current.pop(pid)
+            self._launched.discard(submission)
+            self._resources.release(self._allocations.pop(pid))
+        if process is not None:
+            process.join()
+        self._trial_runs.pop(pid, None)
+        if submission.sweep in self._halving:
+            self._halving[submission.sweep].forget(submission.id)
+        self._executiongraph.pop(submission)
+        self._queue.remove(submission.id)
 
-            process.start()
-            self.current[process] = submission
-            threading.Thread(target=self.watchdog, args=(process,), daemon=True).start()
+    def _notify(self) -> None:
+        for callback in self.on_change:
+            callback()
 
+    def launch_ready_submissions(self) -> None:
+        def not_yet_launched(submission: JobSubmission) -> bool:
+            return submission not in self._launched and submission not in self._capturing
 
-def _run(submission: JobSubmission) -> None:
-    """in new Process"""
+        with self._lock_launch:
+            ready_submissions = filter(not_yet_launched, self._executiongraph.get_leaves())
+            running_per_sweep = collections.Counter(
+                sub.sweep for sub in self._launched if sub.sweep is not None
+            )
+            # in submission order, submissions that don't fit are skipped, so that smaller
+            # submissions can use the remaining resources (backfilling). The resources the
+            # oldest skipped submission lacks are reserved for it, so that it is not starved
+            # by a stream of smaller submissions.
+            reserved: set[str] | None = None
+            for submission in ready_submissions:
+                if (
+                    submission.sweep is not None
+                    and submission.max_concurrent is not None
+                    and running_per_sweep[submission.sweep] >= submission.max_concurrent
+                ):
+                    continue
+                if reserved is not None and submission.resources.uses(reserved):
+                    continue
+                allocation = self._resources.allocate(submission.resources)
+                if allocation is None:
+                    if reserved is None:
+                        reserved = self._resources.shortage(submission.resources)
+                    continue
+
+                print(f"Launched {submission.run_name}")
+                launched = time.time()
+                worker = None
+                if self._workers is not None and WorkerPool.can_run(submission.env, allocation):
+                    worker = self._workers.take()
+                if worker is None:
+                    process: BaseProcess = mp.Process(
+                        target=_run,
+                        args=(submission, allocation, launched),
+                    )
+                    process.start()
+                else:
+                    process, conn = worker
+                    conn.send((submission, allocation, launched))
+                    conn.close()
+
+                assert process.pid is not None
+                self._queue.set_running(submission.id, process.pid, launched, allocation)
+                self._track(process.pid, submission, allocation)
+                self._processes[process.pid] = process
+                if submission.sweep is not None:
+                    running_per_sweep[submission.sweep] += 1
+            self._wakeup_writer.send(None)
+
+    def _track(self, pid: int, submission: JobSubmission, allocation: Allocation) -> None:
+        self.current[pid] = submission
+        self._launched.add(submission)
+        self._allocations[pid] = allocation
+
+
+def is_alive(pid: int, launched: float) -> bool:
+    """whether the process pid, that was launched at POSIX time launched, is still running"""
+    try:
+        process = psutil.Process(pid)
+        # pids are reused, a process created after the launch is a different one
+        return process.create_time() <= launched + 1.0 and process.status() != "zombie"
+    except psutil.NoSuchProcess:
+        return False
+
+
+def read_metric(run: "cvde.job.RunLogger", metric: str, start: int) -> list[tuple[int, float]]:
+    """(index, value) entries of the scalar metric, that run logged after the first start"""
+    entries = run.read_var(metric, start=start)
+    return [(entry.index, float(entry.data)) for entry in entries if np.ndim(entry.data) == 0]
+
+
+def _run(submission: JobSubmission, allocation: Allocation, launched: float) -> None:
+    """in new Process. launched: POSIX time when the scheduler launched the job"""
     for k, v in submission.env.items():
         os.environ[k] = v
+    apply_allocation(allocation)
 
     logger = cvde.job.RunLogger.create(submission)
+    logger.start_heartbeat()
 
     if cvde.Workspace().git_tracking_enabled:
-        subprocess.run(
-            ["git", "clone", ".", str(logger.workspace.resolve())], capture_output=True
-        ).check_returncode()
-
-        os.chdir(logger.workspace)
         assert submission.commit is not None
         assert submission.diff is not None
-
-        subprocess.run(
-            ["git", "checkout", submission.commit], capture_output=True
-        ).check_returncode()
-
-        if logger.root.joinpath("uncommitted.diff").exists():
-            subprocess.run(
-                ["git", "apply", str(logger.root.joinpath("uncommitted.diff").resolve())],
-                capture_output=True,
-            ).check_returncode()
+        # runs with the same state of the code share a cached snapshot
+        if submission.snapshot_commit is not None:
+            # the complete working tree was committed when the code was captured
+            snapshot = get_snapshot(submission.snapshot_commit, "")
+        else:
+            snapshot = get_snapshot(submission.commit, submission.diff)
+        logger.workspace.rmdir()
+        logger.workspace.symlink_to(snapshot, target_is_directory=True)
+        os.chdir(logger.workspace)
 
     job_fn = cvde.Workspace().list_jobs()[submission.job_name]
     job = job_fn(logger=logger, config=submission.config)
@@ -163,6 +564,9 @@ def _run(submission: JobSubmission) -> None:
     def handler(sig: int, frame: Any) -> None:
         print("Terminated by user.")
         job.on_terminate()
+        # write entries that are still queued by an asynchronous logger
+        logger.close()
+        logger.set_status("terminated", exit_code=0)
         exit(0)
 
     signal.signal(signal.SIGTERM, handler)
@@ -170,8 +574,49 @@ def _run(submission: JobSubmission) -> None:
     assert isinstance(sys.stdout, cvde.ThreadPrinter)
     assert isinstance(sys.stderr, cvde.ThreadPrinter)
 
-    # print stdout, err to files as well
-    sys.stdout.register_new_out(job.logger.stdout_file)
-    sys.stderr.register_new_out(job.logger.stderr_file)
-
-    job.run()
+    # print stdout, err to files as well, limited to the first and last MBs of output
+    mb = 1 << 20
+    head_bytes = int(float(os.environ.get("CVDE_MAX_OUTPUT_HEAD_MB", 16)) * mb)
+    tail_bytes = int(float(os.environ.get("CVDE_MAX_OUTPUT_TAIL_MB", 64)) * mb)
+
+    capture = None
+    if submission.capture_fds:
+        # python output is written to the captured fds directly, without colors
+        color = sys.stdout.color
+        sys.stdout = sys.stdout.stream
+        sys.stderr = sys.stderr.stream
+        for stream in [sys.stdout, sys.stderr]:
+            if isinstance(stream, io.TextIOWrapper):
+                stream.reconfigure(line_buffering=True)
+        capture = FdCapture(
+            job.logger.stdout_file,
+            job.logger.stderr_file,
+            head_bytes,
+            tail_bytes,
+            mirror=submission.mirror_output,
+            color=color,
+        )
+        capture.start()
+    else:
+        sys.stdout.register_new_out(job.logger.stdout_file, head_bytes, tail_bytes)
+        sys.stderr.register_new_out(job.logger.stderr_file, head_bytes, tail_bytes)
+
+    # time from the launch until the job runs: process start, imports and checkout of the code
+    logger.set_startup_time(time.time() - launched)
+    print(f"Started {submission.run_name} {logger.startup_seconds:.2f} s after launch.")
+
+    try:
+        job.run()
+    except Exception:
+        logger.set_status("failed", exit_code=1)
+        if capture is None:
+            raise
+        # multiprocessing would print the traceback after the capture is stopped
+        traceback.print_exc()
+        sys.exit(1)
+    else:
+        logger.set_status("finished", exit_code=0)
+    finally:
+        logger.close()
+        if capture is not None:
+            capture.stop()
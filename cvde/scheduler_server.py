@@ -0,0 +1,175 @@
+import os
+import secrets
+import sys
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any
+
+import graphviz
+
+from cvde.job import JobSubmission
+from cvde.scheduler import Scheduler
+
+SOCKET_PATH = Path("log/scheduler.sock")
+
+
+class SchedulerServer:
+    """Serves a Scheduler on a local Unix socket, for `cvde submit`, `cvde queue`,
+    `cvde cancel` and the GUI. Requests are (command, args) tuples, responses are
+    ("ok", result) or ("error", message)."""
+
+    def __init__(self, scheduler: Scheduler, path: Path = SOCKET_PATH) -> None:
+        self.scheduler = scheduler
+        self.path = path
+        # clients wait for changes of the queue with wait_change
+        self._version = 0
+        self._changed = threading.Condition()
+        scheduler.on_change.append(self._on_change)
+
+    def serve_forever(self) -> None:
+        if self.path.exists():
+            # the socket file is left behind, if a previous server was killed
+            self.path.unlink()
+        # requests are pickled, only clients that can read the key may connect
+        authkey = secrets.token_bytes(32)
+        key_path = self.path.with_suffix(".key")
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as F:
+            F.write(authkey)
+        # the socket is only accessible by the user from the start
+        umask = os.umask(0o177)
+        try:
+            listener = Listener(str(self.path), family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(umask)
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    print(f"Rejected connection: {e}", file=sys.stderr)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    command, args = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    result = getattr(self, "cmd_" + command)(*args)
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+                else:
+                    conn.send(("ok", result))
+
+    def _on_change(self) -> None:
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def _find(self, id_or_name: str) -> JobSubmission:
+        for sub in self.scheduler.get_scheduled_submissions():
+            if id_or_name in [sub.id, sub.run_name]:
+                return sub
+        raise KeyError(f"{id_or_name} is not scheduled")
+
+    def cmd_ping(self) -> bool:
+        return True
+
+    def cmd_submit(self, sub: JobSubmission, wait_for: list[str]) -> str:
+        self.scheduler.submit(sub, [self._find(id_or_name) for id_or_name in wait_for])
+        return sub.id
+
+    def cmd_submit_many(self, subs: list[JobSubmission], wait_for: list[str]) -> list[str]:
+        self.scheduler.submit_many(subs, [self._find(id_or_name) for id_or_name in wait_for])
+        return [sub.id for sub in subs]
+
+    def cmd_cancel(self, id_or_name: str) -> None:
+        self.scheduler.cancel(self._find(id_or_name))
+
+    def cmd_queue(self) -> list[dict[str, Any]]:
+        return self.scheduler.get_queue()
+
+    def cmd_scheduled(self) -> list[JobSubmission]:
+        return self.scheduler.get_scheduled_submissions()
+
+    def cmd_digraph(self) -> graphviz.Digraph:
+        return self.scheduler.get_digraph()
+
+    def cmd_errors(self, since: int) -> tuple[list[str], int]:
+        return self.scheduler.get_errors(since)
+
+    def cmd_wait_change(self, version: int, timeout: float) -> int:
+        """returns the current version of the queue, once it differs from version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+
+class SchedulerClient:
+    """Scheduler interface for a SchedulerServer in another process"""
+
+    def __init__(self, path: Path = SOCKET_PATH) -> None:
+        self.path = path
+
+    @staticmethod
+    def connect(path: Path = SOCKET_PATH) -> "SchedulerClient | None":
+        """returns a client, if a server is running"""
+        client = SchedulerClient(path)
+        return client if client.is_running() else None
+
+    def is_running(self) -> bool:
+        try:
+            self._call("ping")
+        except (OSError, EOFError, AuthenticationError):
+            return False
+        return True
+
+    def _call(self, command: str, *args: Any) -> Any:
+        authkey = self.path.with_suffix(".key").read_bytes()
+        with Client(str(self.path), family="AF_UNIX", authkey=authkey) as conn:
+            conn.send((command, args))
+            status, result = conn.recv()
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def submit(
+        self, sub: JobSubmission, wait_for: list[JobSubmission | str] | None = None
+    ) -> None:
+        """wait_for: submissions, or their ids or run names"""
+        ids = [other if isinstance(other, str) else other.id for other in wait_for or []]
+        self._call("submit", sub, ids)
+
+    def submit_many(
+        self, subs: list[JobSubmission], wait_for: list[JobSubmission | str] | None = None
+    ) -> None:
+        """submit e.g. the runs of a sweep at once, see Scheduler.submit_many"""
+        ids = [other if isinstance(other, str) else other.id for other in wait_for or []]
+        self._call("submit_many", subs, ids)
+
+    def cancel(self, sub: JobSubmission | str) -> None:
+        """cancel a submission, given by itself, its id or its run name"""
+        self._call("cancel", sub if isinstance(sub, str) else sub.id)
+
+    def get_queue(self) -> list[dict[str, Any]]:
+        return self._call("queue")
+
+    def get_scheduled_submissions(self) -> list[JobSubmission]:
+        return self._call("scheduled")
+
+    def get_digraph(self) -> graphviz.Digraph:
+        return self._call("digraph")
+
+    def get_errors(self, since: int = 0) -> tuple[list[str], int]:
+        return self._call("errors", since)
+
+    def wait_change(self, version: int, timeout: float = 30.0) -> int:
+        return self._call("wait_change", version, timeout)
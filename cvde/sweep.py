@@ -0,0 +1,181 @@
+import copy
+import itertools
+import math
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+import cvde
+from cvde.job import JobSubmission
+from cvde.early_stopping import EarlyStopping
+from cvde.job.code_capture import capture_async
+
+
+@dataclass
+class Sweep:
+    """Parameter sweep, given by the key `sweep` of a config:
+
+        sweep:
+          method: lhs  # grid, random or lhs (Latin hypercube)
+          samples: 20  # number of runs for random and lhs
+          seed: 0
+          max_concurrent: 4  # runs of the sweep that run at the same time
+          early_stopping: ...  # optional, see cvde.early_stopping.EarlyStopping
+          parameters:
+            model.depth: [2, 4, 8]  # values
+            optimizer.learning_rate: {min: 1.0e-4, max: 1.0e-2, log: true}  # range
+            data.batch_size: {min: 16, max: 128, int: true, num: 4}  # num: points for grid
+
+    Parameters are dotted keys into the config. Grid takes the product of all values,
+    ranges are split into num points. Random and lhs sample values uniformly, in log space
+    for log: true; lhs puts each of the samples into a different stratum of each range.
+    """
+
+    parameters: dict[str, list[Any] | dict[str, Any]]
+    method: str = "grid"
+    samples: int | None = None
+    seed: int | None = None
+    max_concurrent: int | None = None
+    early_stopping: EarlyStopping | None = None
+
+    def __post_init__(self) -> None:
+        if isinstance(self.early_stopping, dict):
+            self.early_stopping = EarlyStopping(**self.early_stopping)
+        if self.method not in ["grid", "random", "lhs"]:
+            raise ValueError(f"Unknown sweep method {self.method}, use grid, random or lhs.")
+        if self.method != "grid" and self.samples is None:
+            raise ValueError(f"A {self.method} sweep needs the number of samples.")
+        for key, values in self.parameters.items():
+            if isinstance(values, dict):
+                if "min" not in values or "max" not in values:
+                    raise ValueError(f"Range of {key} needs min and max.")
+                if self.method == "grid" and "num" not in values:
+                    raise ValueError(f"Range of {key} needs num for a grid sweep.")
+            elif not isinstance(values, list) or len(values) == 0:
+                raise ValueError(f"Values of {key} must be a non-empty list or a range.")
+
+    @staticmethod
+    def from_config(config: dict[str, Any]) -> "Sweep | None":
+        if not isinstance(config, dict) or "sweep" not in config:
+            return None
+        return Sweep(**config["sweep"])
+
+    def points(self) -> list[dict[str, Any]]:
+        """values of the parameters for each run"""
+        keys = list(self.parameters)
+        if self.method == "grid":
+            axes = [grid_values(self.parameters[key]) for key in keys]
+            return [dict(zip(keys, values)) for values in itertools.product(*axes)]
+
+        assert self.samples is not None
+        rng = np.random.default_rng(self.seed)
+        if self.method == "random":
+            u = rng.random((self.samples, len(keys)))
+        else:
+            # one sample per stratum of each parameter, strata paired randomly
+            strata = np.stack([rng.permutation(self.samples) for _ in keys], axis=1)
+            u = (strata + rng.random((self.samples, len(keys)))) / self.samples
+        return [
+            {key: sample_value(self.parameters[key], u[i, j]) for j, key in enumerate(keys)}
+            for i in range(self.samples)
+        ]
+
+    def configs(self, config: dict[str, Any]) -> list[dict[str, Any]]:
+        """config of each run, without the key sweep"""
+        base = {key: value for key, value in config.items() if key != "sweep"}
+        configs = []
+        for point in self.points():
+            run_config = copy.deepcopy(base)
+            for key, value in point.items():
+                set_dotted(run_config, key, value)
+            configs.append(run_config)
+        return configs
+
+
+def grid_values(values: list[Any] | dict[str, Any]) -> list[Any]:
+    if isinstance(values, list):
+        return values
+    low, high, num = float(values["min"]), float(values["max"]), values["num"]
+    space = np.geomspace if values.get("log", False) else np.linspace
+    return [to_value(values, x) for x in space(low, high, num)]
+
+
+def sample_value(values: list[Any] | dict[str, Any], u: float) -> Any:
+    """value at quantile u in [0, 1) of the values or range"""
+    if isinstance(values, list):
+        return values[int(u * len(values))]
+    low, high = float(values["min"]), float(values["max"])
+    if values.get("int", False):
+        high += 1  # inclusive, values are floored
+    if values.get("log", False):
+        return to_value(values, math.exp(math.log(low) + u * (math.log(high) - math.log(low))))
+    return to_value(values, low + u * (high - low))
+
+
+def to_value(values: dict[str, Any], x: float) -> int | float:
+    if values.get("int", False):
+        return min(int(math.floor(x)), int(values["max"]))
+    return float(x)
+
+
+def set_dotted(config: dict[str, Any], key: str, value: Any) -> None:
+    """set config["a"]["b"] for key a.b, missing levels are created"""
+    *path, last = key.split(".")
+    for part in path:
+        config = config.setdefault(part, {})
+        if not isinstance(config, dict):
+            raise ValueError(f"Can't set {key}, {part} is not a dict in the config.")
+    config[last] = value
+
+
+def sweep_tag(name: str) -> str:
+    """tag of the runs of the sweep name"""
+    return f"sweep:{name}"
+
+
+def sweep_id_tag(sweep_id: str) -> str:
+    """tag of the runs of one submission of a sweep, the name can be submitted again"""
+    return f"sweep_id:{sweep_id}"
+
+
+def make_submissions(
+    job_name: str,
+    run_name: str,
+    config: dict[str, Any],
+    tags: list[str],
+    env: dict[str, str],
+    **kwargs: Any,
+) -> list[JobSubmission]:
+    """One submission for a config without sweep, otherwise one per run of the sweep.
+    Runs of a sweep are named <run_name>-<i>, tagged sweep:<run_name> and share one
+    capture of the code, and so one snapshot. They also share a unique sweep id, for
+    max_concurrent and early stopping. kwargs are passed on to JobSubmission."""
+    sweep = Sweep.from_config(config)
+    if sweep is None:
+        return [JobSubmission(job_name, run_name, config, tags, env, **kwargs)]
+
+    configs = sweep.configs(config)
+    # the state of the code is captured once for all runs
+    capture = capture_async() if cvde.Workspace().git_tracking_enabled else None
+    # unique, runs of earlier submissions of run_name are not part of this sweep
+    sweep_id = f"{run_name}-{uuid.uuid4().hex[:8]}"
+    width = len(str(len(configs) - 1))
+    submissions: list[JobSubmission] = []
+    for i, run_config in enumerate(configs):
+        submissions.append(
+            JobSubmission(
+                job_name,
+                f"{run_name}-{i:0{width}d}",
+                run_config,
+                tags + [sweep_tag(run_name), sweep_id_tag(sweep_id)],
+                env,
+                sweep=sweep_id,
+                max_concurrent=sweep.max_concurrent,
+                early_stopping=sweep.early_stopping,
+                code_capture=capture,
+                **kwargs,
+            )
+        )
+    return submissions
@@ -1,10 +1,15 @@
+import atexit
 import colorama
+import os
 import re
 import threading
+import time
 from pathlib import Path
 from typing import Iterator, TextIO, Any, Iterable
 import multiprocessing as mp
 
+from cvde.job.output_file import RotatingFile
+
 
 class ThreadPrinter(TextIO):
     """multiprocessing printer in different colors, with optional file output"""
@@ -18,30 +23,59 @@ class ThreadPrinter(TextIO):
         colorama.Fore.CYAN,
     ]
 
+    # max. seconds until output without newlines (e.g. progress bars) is flushed
+    FLUSH_INTERVAL = 1.0
+
     def __init__(self, stream: TextIO) -> None:
-        # note: file_paths is not synchronized across processes, but because each process
-        #      only needs to access its own file_path, this is not a problem
-        self.file_paths: dict[str, Path] = {}
+        # note: files is not synchronized across processes, but because each process
+        #      only needs to access its own file, this is not a problem
+        self.files: dict[str, RotatingFile] = {}
         self.reset_color = colorama.Fore.RESET
         self.stream = stream
-
-    def register_new_out(self, file_path: Path) -> None:
-        self.file_paths[mp.current_process().name] = file_path
+        self._color: str | None = None
+        self._color_pid: int | None = None
+        self._last_flush = time.monotonic()
+
+    def register_new_out(
+        self,
+        file_path: Path,
+        head_bytes: int = RotatingFile.HEAD_BYTES,
+        tail_bytes: int = RotatingFile.TAIL_BYTES,
+    ) -> None:
+        """write the output of the current process to file_path, keeping its first
+        head_bytes and last tail_bytes"""
+        name = mp.current_process().name
+        if name in self.files:
+            self.files[name].close()
+        else:
+            atexit.register(self._flush_files)
+        # line buffered, the file is kept open until exit
+        self.files[name] = RotatingFile(file_path, head_bytes, tail_bytes)
+
+    @property
+    def color(self) -> str:
+        # computed once per process
+        pid = os.getpid()
+        if self._color is None or self._color_pid != pid:
+            result = re.search("[0-9]+", mp.current_process().name)
+            chosen_index = 0 if result is None else int(result.group())
+            chosen_color = self.COLORS[chosen_index % len(self.COLORS)]
+            is_main = mp.parent_process() is None
+            self._color = colorama.Fore.WHITE if is_main else chosen_color
+            self._color_pid = pid
+        return self._color
 
     def write(self, value: str) -> int:
-        result = re.search("[0-9]+", mp.current_process().name)
-        chosen_index = 0 if result is None else int(result.group())
-        chosen_color = self.COLORS[chosen_index % len(self.COLORS)]
-        is_main = mp.parent_process() is None
-        color = colorama.Fore.WHITE if is_main else chosen_color
+        self.stream.write(self.color + value + self.reset_color)
 
-        self.stream.write(color + value + self.reset_color)
-        self.stream.flush()
+        file = self.files.get(mp.current_process().name)
+        if file is not None:
+            file.write(value)
 
-        if mp.current_process().name in self.file_paths:
-            file_path = self.file_paths[mp.current_process().name]
-            with file_path.open("a") as F:
-                F.write(value)
+        now = time.monotonic()
+        if "\n" in value or now - self._last_flush > self.FLUSH_INTERVAL:
+            self._last_flush = now
+            self.flush()
         return 1
 
     def __eq__(self, other: object) -> bool:
@@ -50,6 +84,14 @@ class ThreadPrinter(TextIO):
 
     def flush(self) -> None:
         self.stream.flush()
+        file = self.files.get(mp.current_process().name)
+        if file is not None and not file.closed:
+            file.flush()
+
+    def _flush_files(self) -> None:
+        for file in self.files.values():
+            if not file.closed:
+                file.flush()
 
     def __enter__(self) -> "ThreadPrinter":
         return self
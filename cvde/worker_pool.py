@@ -0,0 +1,78 @@
+import atexit
+import multiprocessing as mp
+import sys
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+
+from cvde.resources import Allocation
+
+# environment variables that are read when a job uses the GPUs, not when TensorFlow is
+# imported, so that setting them in a warm worker still has an effect
+RUNTIME_ENV = {"CUDA_VISIBLE_DEVICES"}
+
+
+class WorkerPool:
+    """Spawned processes that already imported cvde and its heavy dependencies (e.g.
+    TensorFlow) and wait for a submission to run. Each worker runs one job and exits, so
+    that no state leaks between jobs; it is replaced by a new worker when it is taken."""
+
+    def __init__(self, size: int) -> None:
+        self._ctx = mp.get_context("spawn")
+        self._workers: list[tuple[BaseProcess, Connection]] = []
+        for _ in range(size):
+            self._spawn()
+        # otherwise multiprocessing waits for the idle workers at exit
+        atexit.register(self.close)
+
+    def _spawn(self) -> None:
+        conn, worker_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(worker_conn,))
+        process.start()
+        worker_conn.close()
+        self._workers.append((process, conn))
+
+    @staticmethod
+    def can_run(env: dict[str, str], allocation: Allocation) -> bool:
+        """Whether a worker can run a job with env and allocation. Workers already imported
+        numpy and TensorFlow, which read other environment variables (e.g. XLA_FLAGS, TF_*)
+        and the thread limits of allocated cores (OMP_NUM_THREADS etc.) at import."""
+        return len(allocation.cpu_ids) == 0 and set(env).issubset(RUNTIME_ENV)
+
+    def take(self) -> tuple[BaseProcess, Connection] | None:
+        """a worker that finished its imports, or None if all workers are still starting"""
+        for i, (process, conn) in enumerate(self._workers):
+            if not process.is_alive():
+                print(f"Worker {process.name} exited with {process.exitcode}", file=sys.stderr)
+                conn.close()
+                del self._workers[i]
+                self._spawn()
+                return None
+            if conn.poll():
+                conn.recv()  # ready message
+                del self._workers[i]
+                self._spawn()
+                return process, conn
+        return None
+
+    def close(self) -> None:
+        """stop idle workers"""
+        for process, conn in self._workers:
+            # the worker exits, when its connection is closed
+            conn.close()
+            process.join()
+        self._workers.clear()
+
+
+def _worker_main(conn: Connection) -> None:
+    """in spawned worker process"""
+    import cvde  # slow: imports TensorFlow
+    from cvde.scheduler import _run
+
+    conn.send("ready")
+    try:
+        submission, allocation, launched = conn.recv()
+    except EOFError:
+        return  # pool was closed
+    conn.close()
+
+    _run(submission, allocation, launched)